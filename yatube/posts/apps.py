@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Публикации'
+
+    def ready(self):
+        from . import signals  # noqa: F401
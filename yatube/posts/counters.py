@@ -0,0 +1,68 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, StoredImage, User, UserStats
+
+# bulk_create в SQLite: не больше 500 строк в составном SELECT
+BULK_BATCH = 500
+
+
+def _count(model, field):
+    """Подзапрос: сколько строк model ссылаются на текущую запись."""
+    rows = (model.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'))
+    return Coalesce(Subquery(rows), 0)
+
+
+def recount_posts(post_ids=None):
+    """Число комментариев у всех постов или только у переданных."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    posts.update(comment_count=_count(Comment, 'post'))
+
+
+def recount_users(user_ids=None):
+    """Счётчики всех пользователей или только переданных."""
+    users = User.objects.all()
+    stats = UserStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in users.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()],
+        batch_size=BULK_BATCH)
+    stats.update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'))
+
+
+def recount():
+    """Пересчитывает все денормализованные счётчики."""
+    recount_posts()
+    recount_users()
+
+
+def recount_images(names=None):
+    """Пересчитывает ссылки постов на все файлы картинок или на переданные."""
+    posts = Post.objects.filter(image__gt='')
+    stored = StoredImage.objects.all()
+    if names is not None:
+        posts = posts.filter(image__in=names)
+        stored = stored.filter(name__in=names)
+    names = (posts
+             .exclude(image__in=StoredImage.objects.values('name'))
+             .order_by()
+             .values_list('image', flat=True)
+             .distinct())
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=name) for name in names.iterator()],
+        batch_size=BULK_BATCH)
+    # файлы без ссылок остаются с нулём: их убирает сборка мусора
+    stored.update(refs=_count(Post, 'image'))
@@ -0,0 +1,104 @@
+"""Валидаторы для условного GET: ETag считается до сборки страницы.
+
+Каждая функция читает то, что видно на странице: страницу ленты, группу,
+автора со счётчиками, пост. Совпал If-None-Match — ответ 304 без рендера
+шаблона. Иначе вьюха берёт прочитанное через validated() и не повторяет
+запросы, так что промах ETag стоит столько же, сколько страница без него.
+"""
+import hashlib
+
+from django.db.models import Exists, OuterRef
+
+from .models import Follow, Group, Post, User
+from .paginator import INDEX_SCOPE, paginate
+from .settings import PAGE_CACHE_PARAMS
+
+# Поля автора для шапки профиля и страницы поста
+AUTHOR_STATS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _etag(request, *parts):
+    params = [(name, request.GET.get(name))
+              for name in PAGE_CACHE_PARAMS if name in request.GET]
+    # в формах страницы {% csrf_token %} из секрета, который меняется
+    # при входе: после перелогина старая страница не годится
+    token = (request.META.get('CSRF_COOKIE')
+             if request.user.is_authenticated else None)
+    raw = repr((request.user.get_username(), token, params, parts)).encode()
+    return hashlib.md5(raw).hexdigest()
+
+
+def _remember(request, **objects):
+    """Прочитанное валидатором отдаётся вьюхе через validated()."""
+    request.etag_objects = {**getattr(request, 'etag_objects', {}),
+                            **objects}
+
+
+def validated(request, name):
+    """Объект, который уже прочитал валидатор этого запроса, или None."""
+    return getattr(request, 'etag_objects', {}).get(name)
+
+
+def _row(queryset):
+    # поиск по уникальному полю: сортировка из Meta не нужна
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def _author(author):
+    stats = getattr(author, 'stats', None)
+    return (author.pk, author.first_name, author.last_name,
+            tuple(getattr(stats, field, None) for field in AUTHOR_STATS))
+
+
+def _feed(request, post_list, scope):
+    """Подписи карточек текущей страницы и длина ленты."""
+    page = paginate(request, post_list.select_related('author', 'group'),
+                    scopes=[scope])
+    _remember(request, page=page)
+    rows = [(post.pk, post.version, post.author.username,
+             post.group and (post.group.slug, post.group.title))
+            for post in page]
+    return rows, page.number and page.paginator.count
+
+
+def _following(request, author):
+    return Exists(Follow.objects.filter(
+        user_id=request.user.pk, author=author))
+
+
+def index_etag(request):
+    return _etag(request, _feed(request, Post.objects.all(), INDEX_SCOPE))
+
+
+def group_etag(request, slug):
+    group = _row(Group.objects.filter(slug=slug))
+    if group is None:
+        return None
+    _remember(request, group=group)
+    return _etag(request, (group.pk, group.title, group.description),
+                 _feed(request, Post.objects.filter(group_id=group.pk),
+                       f'group:{group.pk}'))
+
+
+def profile_etag(request, username):
+    author = _row(User.objects.select_related('stats').filter(
+        username=username
+    ).annotate(is_following=_following(request, OuterRef('pk'))))
+    if author is None:
+        return None
+    _remember(request, author=author)
+    return _etag(request, _author(author), author.is_following,
+                 _feed(request, Post.objects.filter(author_id=author.pk),
+                       f'author:{author.pk}'))
+
+
+def post_etag(request, username, post_id):
+    post = _row(Post.objects.select_related('author__stats', 'group').filter(
+        id=post_id, author__username=username
+    ).annotate(is_following=_following(request, OuterRef('author'))))
+    if post is None:
+        return None
+    _remember(request, post=post)
+    return _etag(request, post.pk, post.version,
+                 post.group and (post.group.slug, post.group.title),
+                 _author(post.author), post.is_following)
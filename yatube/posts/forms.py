@@ -1,13 +1,33 @@
+from functools import partial
+
 from django import forms
 
+from .images import sanitize
 from .models import Post, Comment
 
 
+def sanitized_upload(field, data):
+    """to_python поля картинки: загрузка открывается один раз, по заголовку.
+
+    Стандартный ImageField.to_python открывает и целиком проверяет
+    картинку ещё до clean_<поле>; sanitize проверяет её сам.
+    """
+    upload = forms.FileField.to_python(field, data)
+    # сохранённый файл уже проверен: to_python видит только загрузки
+    return None if upload is None else sanitize(upload)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        image = self.fields['image']
+        # поле остаётся forms.ImageField, меняется только разбор загрузки
+        image.to_python = partial(sanitized_upload, image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,201 @@
+"""Проверка и очистка картинок постов с ограниченной памятью.
+
+Загрузка крупнее FILE_UPLOAD_MAX_MEMORY_SIZE уже лежит во временном
+файле. Поле картинки PostForm открывает её один раз, без
+Image.verify() стандартного ImageField: размеры читаются из заголовка,
+метаданные вырезаются потоково, сегмент за сегментом, а слишком большие
+JPEG декодируются сразу в уменьшенном масштабе (draft), не разворачивая
+в памяти оригинал.
+"""
+import struct
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+from .settings import (POST_IMAGE_MAX_BYTES, POST_IMAGE_MAX_DECODE_PIXELS,
+                       POST_IMAGE_MAX_PIXELS, POST_IMAGE_MAX_SIDE,
+                       POST_IMAGE_QUALITY)
+
+CHUNK = 64 * 1024
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# JPEG с телефонов несёт в APP2 индекс MPF и после первого кадра ещё
+# картинки (глубину, превью): Pillow открывает такой файл как MPO
+ALIASES = {'MPO': 'JPEG'}
+MPF_HEADER = b'MPF\x00'
+EXIF_ORIENTATION = 0x0112
+# APP1 (EXIF, XMP), APP13 (IPTC) и комментарий; ICC-профиль остаётся
+JPEG_METADATA = {0xE1, 0xED, 0xFE}
+PNG_METADATA = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _invalid():
+    return ValidationError('Загрузите правильное изображение.',
+                           code='invalid_image')
+
+
+def _read(src, size):
+    data = src.read(size)
+    if len(data) != size:
+        raise _invalid()
+    return data
+
+
+def _copy(src, dst, size):
+    while size > 0:
+        chunk = _read(src, min(CHUNK, size))
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _copy_scan(src, dst):
+    """Копирует сжатые данные до EOI первого кадра включительно.
+
+    Внутри них байт 0xFF всегда экранирован, так что первый FF D9 —
+    конец кадра. Хвост после него (кадры MPO, приклеенные данные) пропадает.
+    """
+    tail = b''
+    while True:
+        chunk = src.read(CHUNK)
+        if not chunk:
+            dst.write(tail)
+            return
+        data = tail + chunk
+        end = data.find(b'\xff\xd9')
+        if end != -1:
+            dst.write(data[:end + 2])
+            return
+        dst.write(data[:-1])
+        tail = data[-1:]
+
+
+def strip_jpeg(src, dst):
+    """Копирует первый кадр JPEG без сегментов с метаданными и MPF."""
+    dst.write(_read(src, 2))
+    while True:
+        marker = _read(src, 2)
+        while marker == b'\xff\xff':
+            marker = b'\xff' + _read(src, 1)
+        if marker[0] != 0xFF:
+            raise _invalid()
+        code = marker[1]
+        if code == 0xD9:
+            dst.write(marker)
+            return
+        if code == 0xDA:
+            # дальше сжатые данные: они копируются как есть
+            dst.write(marker)
+            _copy_scan(src, dst)
+            return
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            dst.write(marker)
+            continue
+        length = _read(src, 2)
+        size = struct.unpack('>H', length)[0] - 2
+        if code in JPEG_METADATA:
+            src.seek(size, 1)
+            continue
+        head = _read(src, min(size, len(MPF_HEADER)))
+        if code == 0xE2 and head == MPF_HEADER:
+            # смещения MPF указывают на отрезанные кадры; ICC тоже в APP2
+            src.seek(size - len(head), 1)
+        else:
+            dst.write(marker + length + head)
+            _copy(src, dst, size - len(head))
+
+
+def strip_png(src, dst):
+    """Копирует PNG без текстовых и EXIF-чанков и без хвоста после IEND."""
+    if _read(src, 8) != PNG_SIGNATURE:
+        raise _invalid()
+    dst.write(PNG_SIGNATURE)
+    while True:
+        header = _read(src, 8)
+        size, kind = struct.unpack('>I4s', header)
+        if kind in PNG_METADATA:
+            src.seek(size + 4, 1)
+        else:
+            dst.write(header)
+            _copy(src, dst, size + 4)
+        if kind == b'IEND':
+            return
+
+
+def image_format(image):
+    """Формат картинки; MPO считается JPEG."""
+    return ALIASES.get(image.format, image.format)
+
+
+def reencode(image):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE и поворачивает по EXIF."""
+    box = (POST_IMAGE_MAX_SIDE, POST_IMAGE_MAX_SIDE)
+    if image_format(image) == 'JPEG':
+        # декодер сам уменьшает в 2-8 раз: оригинал в память не попадает
+        scale = min(1, POST_IMAGE_MAX_SIDE / max(image.size))
+        image.draft(image.mode, (round(image.width * scale),
+                                 round(image.height * scale)))
+    output_format = image_format(image)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(box, Image.LANCZOS)
+    image.info.pop('exif', None)
+    dst = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if output_format in ('JPEG', 'WEBP'):
+        options['quality'] = POST_IMAGE_QUALITY
+    image.save(dst, output_format, **options)
+    return dst
+
+
+def probe(upload):
+    """Открывает загрузку по заголовку и проверяет формат и лимиты."""
+    if upload.size > POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.', code='file_too_large',
+            params={'limit': POST_IMAGE_MAX_BYTES // 2 ** 20})
+    upload.seek(0)
+    try:
+        # Image.open читает только заголовок
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Слишком большое изображение.',
+                              code='image_too_large')
+    except Exception:
+        raise _invalid()
+    if image_format(image) not in FORMATS:
+        raise ValidationError(
+            'Поддерживаются форматы: %(formats)s.', code='invalid_format',
+            params={'formats': ', '.join(FORMATS)})
+    # без draft декодер разворачивает картинку целиком
+    limit = (POST_IMAGE_MAX_PIXELS if image_format(image) == 'JPEG'
+             else POST_IMAGE_MAX_DECODE_PIXELS)
+    if image.width * image.height > limit:
+        raise ValidationError('Слишком большое изображение.',
+                              code='image_too_large')
+    return image
+
+
+def sanitize(upload):
+    """Проверенная копия загрузки без метаданных; ValidationError иначе."""
+    image = probe(upload)
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    if (max(image.size) > POST_IMAGE_MAX_SIDE or orientation != 1
+            or (image.format == 'WEBP' and 'exif' in image.info)):
+        try:
+            dst = reencode(image)
+        except (OSError, SyntaxError):
+            raise _invalid()
+    elif image_format(image) in ('JPEG', 'PNG'):
+        dst = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        upload.seek(0)
+        strip = strip_jpeg if image_format(image) == 'JPEG' else strip_png
+        strip(upload, dst)
+    else:
+        # в GIF нет EXIF: файл остаётся как есть
+        upload.seek(0)
+        return upload
+    dst.seek(0)
+    return File(dst, name=upload.name)
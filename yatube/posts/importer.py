@@ -0,0 +1,312 @@
+"""Массовая загрузка постов, комментариев и подписок.
+
+Строки читаются потоком из NDJSON или CSV и пишутся пачками по
+IMPORT_BATCH через bulk_create, каждая пачка — в своей транзакции.
+Авторы и группы ищутся по username и slug в картах, которые дополняются
+одним запросом на пачку; отсутствующие создаются.
+
+bulk_create обходит сигналы: счётчики, ленты подписок и кэш страниц
+приводит в порядок finish() одним проходом в конце. Индекс поиска
+ведут триггеры.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import timeline
+from .counters import recount_images, recount_posts, recount_users
+from .media_gc import chunks
+from .models import Comment, Follow, Group, Post, User
+from .page_cache import invalidate_pages, invalidate_post_pages
+from .paginator import INDEX_SCOPE, invalidate_feed_counts
+from .settings import IMPORT_BATCH, IMPORT_LOOKUP_CHUNK
+
+
+def read_ndjson(file):
+    """Пары (номер строки, объект); битая строка приходит как ошибка."""
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record = error
+        if not isinstance(record, (dict, ValueError)):
+            record = ValueError('ожидается объект JSON')
+        yield number, record
+
+
+def read_csv(file):
+    """Пары (номер строки, объект) по заголовку CSV; пустое — None."""
+    reader = csv.DictReader(file)
+    for record in reader:
+        yield reader.line_num, {key: value or None
+                                for key, value in record.items()}
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def _text(record, field):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'пустое поле {field}')
+    return value
+
+
+def _date(record, field):
+    value = record.get(field)
+    if not value:
+        return timezone.now()
+    date = parse_datetime(str(value))
+    if date is None:
+        raise ValueError(f'неверная дата в поле {field}: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _id(record, field):
+    value = record.get(field)
+    return None if value in (None, '') else int(value)
+
+
+def parse_post(record):
+    return {'id': _id(record, 'id'),
+            'text': _text(record, 'text'),
+            'author': _text(record, 'author'),
+            'group': record.get('group') or None,
+            # имя уже лежащего в хранилище файла
+            'image': record.get('image') or None,
+            'pub_date': _date(record, 'pub_date')}
+
+
+def parse_comment(record):
+    post = _id(record, 'post')
+    if post is None:
+        raise ValueError('пустое поле post')
+    return {'post': post,
+            'text': _text(record, 'text'),
+            'author': _text(record, 'author'),
+            'created': _date(record, 'created')}
+
+
+def parse_follow(record):
+    row = {'user': _text(record, 'user'), 'author': _text(record, 'author')}
+    if row['user'] == row['author']:
+        raise ValueError('подписка на самого себя')
+    return row
+
+
+class RawInsertQuerySet(QuerySet):
+    """bulk_create без pre_save полей, как у loaddata.
+
+    auto_now_add не перетирает даты, пришедшие из источника; сами поля
+    модели не меняются, так что запись в других потоках их не теряет.
+    """
+
+    def _insert(self, objs, fields, **kwargs):
+        kwargs['raw'] = True
+        return super()._insert(objs, fields, **kwargs)
+
+
+class Lookup:
+    """Карта ключ -> id, дополняемая пачками; недостающие создаются."""
+
+    def __init__(self, model, field, make):
+        self.model = model
+        self.field = field
+        self.make = make
+        self.ids = {}
+        self.created = 0
+
+    def _load(self, keys):
+        self.ids.update(self.model.objects.filter(
+            **{f'{self.field}__in': keys}).values_list(self.field, 'pk'))
+
+    def resolve(self, keys):
+        missing = sorted({key for key in keys if key} - self.ids.keys())
+        for chunk in chunks(missing, IMPORT_LOOKUP_CHUNK):
+            self._load(chunk)
+            new = [key for key in chunk if key not in self.ids]
+            if new:
+                self.model.objects.bulk_create(
+                    [self.make(key) for key in new], ignore_conflicts=True)
+                self.created += len(new)
+                self._load(new)
+        return self.ids
+
+
+def existing_posts(ids):
+    found = set()
+    for chunk in chunks(sorted(set(ids)), IMPORT_LOOKUP_CHUNK):
+        found.update(Post.objects.filter(id__in=chunk).values_list(
+            'id', flat=True))
+    return found
+
+
+class Importer:
+    """Загрузка строк posts, comments и follows с общим finish() в конце."""
+
+    def __init__(self, batch=IMPORT_BATCH, on_skip=None):
+        self.kinds = {
+            'posts': (parse_post, self.save_posts),
+            'comments': (parse_comment, self.save_comments),
+            'follows': (parse_follow, self.save_follows),
+        }
+        self.batch = batch
+        self.on_skip = on_skip
+        self.users = Lookup(User, 'username', lambda username: User(
+            username=username, password=make_password(None)))
+        self.groups = Lookup(Group, 'slug', lambda slug: Group(
+            title=slug, slug=slug))
+        self.read = self.written = self.skipped = 0
+        # что пересчитать, разложить по лентам и сбросить в finish()
+        self.authors = set()
+        self.group_ids = set()
+        self.followers = defaultdict(set)
+        self.commented = set()
+        self.images = set()
+        self.scopes = set()
+        self.explicit_ids = False
+        self.line = None
+
+    def skip(self, number, error):
+        self.skipped += 1
+        if self.on_skip:
+            self.on_skip(number, error)
+
+    def run(self, kind, records):
+        """Пишет строки пачками и уступает управление после каждой."""
+        parse, save = self.kinds[kind]
+        for chunk in chunks(records, self.batch):
+            # первая строка пачки: ею сообщается об ошибке записи
+            self.line = chunk[0][0]
+            rows = []
+            for number, record in chunk:
+                self.read += 1
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    rows.append(dict(parse(record), line=number))
+                except (TypeError, ValueError) as error:
+                    self.skip(number, error)
+            with transaction.atomic():
+                self.written += save(rows)
+            yield
+
+    def save_posts(self, rows):
+        users = self.users.resolve(row['author'] for row in rows)
+        groups = self.groups.resolve(row['group'] for row in rows)
+        RawInsertQuerySet(Post).bulk_create([
+            Post(id=row['id'], text=row['text'],
+                 author_id=users[row['author']],
+                 group_id=groups.get(row['group']),
+                 image=row['image'], pub_date=row['pub_date'],
+                 thumbnails_ready=not row['image'])
+            for row in rows])
+        self.explicit_ids |= any(row['id'] is not None for row in rows)
+        self.images.update(row['image'] for row in rows if row['image'])
+        self.authors.update(users[row['author']] for row in rows)
+        self.group_ids.update(groups[row['group']] for row in rows
+                              if row['group'])
+        self.scopes.update(f'author:{row["author"]}' for row in rows)
+        self.scopes.update(f'group:{row["group"]}' for row in rows
+                           if row['group'])
+        return len(rows)
+
+    def save_comments(self, rows):
+        posts = existing_posts(row['post'] for row in rows)
+        for row in rows:
+            if row['post'] not in posts:
+                self.skip(row['line'], ValueError(f'нет поста {row["post"]}'))
+        rows = [row for row in rows if row['post'] in posts]
+        users = self.users.resolve(row['author'] for row in rows)
+        RawInsertQuerySet(Comment).bulk_create([
+            Comment(post_id=row['post'], author_id=users[row['author']],
+                    text=row['text'], created=row['created'])
+            for row in rows])
+        commented = {row['post'] for row in rows}
+        self.commented |= commented
+        # карточки кэшируются по версии поста, а в них число комментариев
+        for chunk in chunks(sorted(commented), IMPORT_LOOKUP_CHUNK):
+            Post.objects.filter(id__in=chunk).update(
+                version=F('version') + 1)
+            invalidate_post_pages(*chunk)
+        return len(rows)
+
+    def save_follows(self, rows):
+        users = self.users.resolve(
+            [row['user'] for row in rows] + [row['author'] for row in rows])
+        # повтор подписки упирается в unique_followers и пропускается
+        Follow.objects.bulk_create([
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows], ignore_conflicts=True)
+        for row in rows:
+            self.followers[users[row['author']]].add(users[row['user']])
+        self.scopes.update(f'author:{row[field]}' for row in rows
+                           for field in ('user', 'author'))
+        return len(rows)
+
+    def recount(self):
+        """Счётчики затронутых пользователей и постов, ссылки на файлы."""
+        for chunk in chunks(sorted(self.users.ids.values()),
+                            IMPORT_LOOKUP_CHUNK):
+            recount_users(chunk)
+        for chunk in chunks(sorted(self.commented), IMPORT_LOOKUP_CHUNK):
+            recount_posts(chunk)
+        # миниатюры нарежет generate_thumbnails: посты в очереди
+        for chunk in chunks(sorted(self.images), IMPORT_LOOKUP_CHUNK):
+            recount_images(chunk)
+
+    def rebuild_timelines(self):
+        """Новые посты — всем подписчикам, новые подписки — их читателям."""
+        for chunk in chunks(sorted(self.authors), IMPORT_LOOKUP_CHUNK):
+            with transaction.atomic():
+                timeline.rebuild(chunk)
+        for author_id, user_ids in sorted(self.followers.items()):
+            if author_id in self.authors:
+                continue
+            for chunk in chunks(sorted(user_ids), IMPORT_LOOKUP_CHUNK):
+                with transaction.atomic():
+                    timeline.rebuild([author_id], chunk)
+
+    def invalidate_counts(self):
+        """Сбрасывает счётчики лент, длину которых изменила загрузка."""
+        if self.authors:
+            invalidate_feed_counts(INDEX_SCOPE)
+        invalidate_feed_counts(
+            *(f'author:{pk}' for pk in self.authors),
+            *(f'group:{pk}' for pk in self.group_ids),
+            *(f'follow:{pk}' for user_ids in self.followers.values()
+              for pk in user_ids))
+        # ленты подписчиков авторов с новыми постами
+        for chunk in chunks(sorted(self.authors), IMPORT_LOOKUP_CHUNK):
+            invalidate_feed_counts(*(
+                f'follow:{pk}' for pk in Follow.objects.filter(
+                    author_id__in=chunk).values_list(
+                        'user_id', flat=True).distinct()))
+
+    def finish(self):
+        """Пересчитывает то, что при обычной записи делают сигналы.
+
+        Только для затронутых загрузкой записей, а не по всей базе.
+        """
+        self.recount()
+        self.rebuild_timelines()
+        if self.explicit_ids:
+            # id из источника не двигают последовательность PostgreSQL
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), [Post]):
+                    cursor.execute(sql)
+        self.invalidate_counts()
+        for chunk in chunks(sorted(self.scopes)):
+            invalidate_pages(*chunk)
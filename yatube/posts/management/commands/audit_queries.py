@@ -0,0 +1,105 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginator import encode_cursor
+from posts.settings import PAGINATOR_COUNT
+
+# Признаки плохого плана в выводе EXPLAIN QUERY PLAN
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def plan_problems(rows):
+    """Полные сканы таблиц и сортировки во временном B-дереве."""
+    for row in rows:
+        detail = row[-1]
+        if TEMP_SORT in detail:
+            yield detail
+        elif detail.startswith('SCAN ') and ' USING ' not in detail:
+            # проход по подзапросу или константе — не скан таблицы
+            if not detail.upper().startswith(('SCAN CONSTANT',
+                                              'SCAN SUBQUERY')):
+                yield detail
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет страницы posts.views на тестовых данных и '
+            'печатает запросы с полным сканом или сортировкой')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=PAGINATOR_COUNT * 5,
+            help='Сколько постов создать для прогона')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться ошибкой, если найдены проблемы')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Нужна база SQLite: используется '
+                               'EXPLAIN QUERY PLAN')
+        # тестовые данные живут только внутри откатываемой транзакции
+        with transaction.atomic():
+            client, urls = self.seed(options['posts'])
+            problems = sum(self.audit(client, url) for url in urls)
+            transaction.set_rollback(True)
+        if problems and options['strict']:
+            raise CommandError(f'Проблемных запросов: {problems}')
+        if problems:
+            self.stdout.write(self.style.WARNING(
+                f'Проблемных запросов: {problems}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Полных сканов нет'))
+
+    def seed(self, posts):
+        suffix = uuid.uuid4().hex[:8]
+        author = User.objects.create_user(f'audit-author-{suffix}')
+        reader = User.objects.create_user(f'audit-reader-{suffix}')
+        group = Group.objects.create(title=suffix, slug=f'audit-{suffix}')
+        Follow.objects.create(user=reader, author=author)
+        for number in range(max(posts, PAGINATOR_COUNT * 2)):
+            post = Post.objects.create(
+                text=f'audit-{number}', author=author, group=group)
+        Comment.objects.create(post=post, author=reader, text=suffix)
+        cursor = encode_cursor(
+            author.posts.order_by('-pub_date', '-id')[PAGINATOR_COUNT])
+        feeds = [
+            reverse('index'),
+            reverse('group_posts', args=[group.slug]),
+            reverse('profile', args=[author.username]),
+            reverse('follow_index'),
+        ]
+        urls = [reverse('post', args=[author.username, post.id])]
+        for feed in feeds:
+            urls += [feed,
+                     f'{feed}?page=2',
+                     f'{feed}?after={cursor}',
+                     f'{feed}?before={cursor}']
+        client = Client()
+        client.force_login(reader)
+        # уникальный параметр обходит кэш страниц
+        return client, [f'{url}{"&" if "?" in url else "?"}audit={suffix}'
+                        for url in urls]
+
+    def audit(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        self.stdout.write(f'{url}: {len(queries)} запросов')
+        problems = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                details = list(plan_problems(cursor.fetchall()))
+                if details:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(
+                        '  {}\n    {}'.format('; '.join(details), sql)))
+        return problems
@@ -0,0 +1,147 @@
+import json
+import math
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.settings import PAGINATOR_COUNT
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу, share от 0 до 100."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share / 100 * len(ordered)) - 1, 0)]
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет страницы на текущих данных (см. seed_data): '
+            'p50/p95/p99 времени, число запросов и пик памяти на '
+            'страницу; сохраняет результат в JSON и сравнивает с прежним')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеров на страницу')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--warm', action='store_true',
+                            help='Не очищать кэш перед запросом')
+        parser.add_argument('-o', '--output', help='Сохранить JSON')
+        parser.add_argument('--compare', help='JSON прежнего прогона')
+
+    def handle(self, *args, **options):
+        reader = UserStats.objects.order_by(
+            '-following_count').select_related('user').first()
+        author = UserStats.objects.order_by(
+            '-posts_count').select_related('user').first()
+        group = Group.objects.order_by('-id').first()
+        if not (reader and author and author.posts_count and group):
+            raise CommandError('Нет данных: сначала seed_data')
+        post = Post.objects.filter(author_id=author.user_id).order_by(
+            '-comment_count').first()
+        pages = max(Post.objects.count() // PAGINATOR_COUNT, 1)
+        views = {
+            'index': reverse('index'),
+            'index_deep': f'{reverse("index")}?page={pages // 2 or 1}',
+            'group_posts': reverse('group_posts', args=[group.slug]),
+            'profile': reverse('profile', args=[author.user.username]),
+            'post_view': reverse('post', args=[author.user.username,
+                                               post.id]),
+            'follow_index': reverse('follow_index'),
+        }
+        client = Client()
+        client.force_login(reader.user)
+        self.stdout.write('{:<14} {:>6} {:>9} {:>9} {:>9} {:>8} {:>10}'.format(
+            'view', 'status', 'p50, ms', 'p95, ms', 'p99, ms', 'queries',
+            'peak, KB'))
+        results = {}
+        for name, url in views.items():
+            results[name] = result = self.measure(client, url, options)
+            self.stdout.write(
+                '{:<14} {status:>6} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} '
+                '{queries:>8} {peak_kb:>10}'.format(name, **result))
+        report = {
+            'commit': commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rows': {model.__name__: model.objects.count()
+                     for model in (User, Post, Comment, Follow, Group)},
+            'requests': options['requests'],
+            'warm': options['warm'],
+            'views': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def get(self, client, url, warm):
+        if not warm:
+            cache.clear()
+        return client.get(url)
+
+    def measure(self, client, url, options):
+        warm = options['warm']
+        for _ in range(options['warmup']):
+            self.get(client, url, warm)
+        timings = []
+        for _ in range(options['requests']):
+            if not warm:
+                cache.clear()
+            # журнал запросов ограничен: CaptureQueriesContext врёт,
+            # когда он переполнен
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            # срез журнала ленивый, а следующий запрос его очистит
+            query_count = len(queries)
+        # отдельный запрос: трассировка памяти искажает время
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result = {f'p{share}': percentile(timings, share)
+                  for share in PERCENTILES}
+        result.update(status=response.status_code, queries=query_count,
+                      peak_kb=peak // 1024, url=url)
+        return result
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            before = json.load(file)
+        self.stdout.write(f'Изменение к {before.get("commit") or path}:')
+        for name, result in results.items():
+            old = before['views'].get(name)
+            if not old:
+                continue
+            deltas = ['{} {:+.0f}%'.format(
+                key, (result[key] / old[key] - 1) * 100 if old[key] else 0)
+                for key in ('p50', 'p95', 'p99')]
+            self.stdout.write('{:<14} {}, queries {:+d}'.format(
+                name, ', '.join(deltas), result['queries'] - old['queries']))
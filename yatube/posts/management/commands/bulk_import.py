@@ -0,0 +1,72 @@
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts.importer import READERS, Importer
+from posts.settings import IMPORT_BATCH
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из NDJSON или CSV '
+            'пачками bulk_create. Поля: posts — id, text, author, group, '
+            'image, pub_date; comments — post, text, author, created; '
+            'follows — user, author. Авторы и группы задаются username и '
+            'slug, image — имя файла в хранилище картинок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['posts', 'comments', 'follows'])
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--batch', type=int, default=IMPORT_BATCH,
+                            help='Строк на bulk_create и транзакцию')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        self.verbosity = options['verbosity']
+        importer = Importer(options['batch'], on_skip=self.report_skip)
+        start = time.perf_counter()
+        file = (sys.stdin if path == '-'
+                else open(path, encoding='utf-8', newline=''))
+        try:
+            with file:
+                for _ in importer.run(options['kind'],
+                                      READERS[data_format](file)):
+                    if self.verbosity > 1:
+                        elapsed = time.perf_counter() - start
+                        self.stdout.write(
+                            f'строк: {importer.read}, '
+                            f'{importer.read / elapsed:.0f} строк/с')
+        except IntegrityError as error:
+            # прежние пачки уже в базе: счётчики и ленты всё равно нужны
+            importer.finish()
+            raise CommandError(
+                f'Пачка со строки {importer.line} не записана: {error}')
+        except OSError as error:
+            raise CommandError(error)
+        loaded = time.perf_counter() - start
+        importer.finish()
+        finished = time.perf_counter() - start - loaded
+        self.stdout.write(
+            f'Прочитано {importer.read}, записано {importer.written}, '
+            f'пропущено {importer.skipped}; новых пользователей '
+            f'{importer.users.created}, групп {importer.groups.created}')
+        rate = importer.read / loaded if loaded else 0
+        self.stdout.write(
+            f'Загрузка {loaded:.1f} с, {rate:.0f} строк/с; пересчёт '
+            f'{finished:.1f} с; пик памяти {self.peak_memory():.1f} МБ')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def report_skip(self, number, error):
+        if self.verbosity > 1:
+            self.stderr.write(f'строка {number}: {error}')
+
+    @staticmethod
+    def peak_memory():
+        # ru_maxrss в Linux — в килобайтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
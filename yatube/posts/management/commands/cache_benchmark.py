@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from yatube.cache import SQLiteCache
+
+TABLE = 'cache_benchmark'
+BATCH = 10
+
+
+def _worker(cache, keys, payload, renders):
+    """Воркер рендерит страницу, только если её нет в кэше."""
+    connections.close_all()
+    for key in keys:
+        if cache.get(key) is None:
+            cache.set(key, payload)
+            with renders.get_lock():
+                renders.value += 1
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает LocMemCache, DatabaseCache и общий SQLiteCache: '
+            'скорость операций и число рендеров в нескольких процессах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000,
+                            help='Операций на замер')
+        parser.add_argument('--size', type=int, default=20000,
+                            help='Размер значения в байтах (страница)')
+        parser.add_argument('--processes', type=int, default=4,
+                            help='Воркеров для проверки общего кэша')
+        parser.add_argument('--skip-db', action='store_true',
+                            help='Не замерять DatabaseCache')
+
+    def handle(self, *args, **options):
+        payload = 'x' * options['size']
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [
+                ('locmem', LocMemCache('benchmark', {
+                    'OPTIONS': {'MAX_ENTRIES': options['ops'] * 2}})),
+                ('sqlite', SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'),
+                    {'OPTIONS': {'MAX_ENTRIES': options['ops'] * 2}})),
+            ]
+            if not options['skip_db']:
+                with override_settings(CACHES={TABLE: {
+                        'BACKEND': 'django.core.cache.backends.db.'
+                                   'DatabaseCache',
+                        'LOCATION': TABLE}}):
+                    call_command('createcachetable', verbosity=0)
+                backends.append(('db', DatabaseCache(TABLE, {
+                    'OPTIONS': {'MAX_ENTRIES': options['ops'] * 2}})))
+            self.stdout.write('{:<8} {:>10} {:>10} {:>12} {:>8}'.format(
+                'backend', 'set/s', 'get/s', 'get_many/s', 'renders'))
+            try:
+                for name, cache in backends:
+                    self.stdout.write('{:<8} {:>10.0f} {:>10.0f} {:>12.0f} '
+                                      '{:>8}'.format(
+                                          name,
+                                          *self.measure(cache, options,
+                                                        payload),
+                                          self.renders(cache, options,
+                                                       payload)))
+            finally:
+                if not options['skip_db']:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f'DROP TABLE {connection.ops.quote_name(TABLE)}')
+        self.stdout.write(
+            f'renders: сколько раз {options["processes"]} процесса '
+            f'отрендерили {BATCH} страниц; у общего кэша это {BATCH}')
+
+    def measure(self, cache, options, payload):
+        cache.clear()
+        keys = [f'bench:{number}' for number in range(options['ops'])]
+        rates = []
+        start = time.perf_counter()
+        for key in keys:
+            cache.set(key, payload)
+        rates.append(len(keys) / (time.perf_counter() - start))
+        start = time.perf_counter()
+        for key in keys:
+            cache.get(key)
+        rates.append(len(keys) / (time.perf_counter() - start))
+        start = time.perf_counter()
+        for offset in range(0, len(keys), BATCH):
+            cache.get_many(keys[offset:offset + BATCH])
+        rates.append(len(keys) / BATCH / (time.perf_counter() - start))
+        return rates
+
+    def renders(self, cache, options, payload):
+        cache.clear()
+        keys = [f'page:{number}' for number in range(BATCH)]
+        context = multiprocessing.get_context('fork')
+        renders = context.Value('i', 0)
+        workers = [context.Process(target=_worker,
+                                   args=(cache, keys, payload, renders))
+                   for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return renders.value
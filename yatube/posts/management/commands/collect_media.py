@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from posts.media_gc import (delete_image, delete_source, delete_thumbnail,
+                            has_kvstore, orphan_images, orphan_sources,
+                            orphan_thumbnails)
+from posts.settings import MEDIA_GC_MIN_AGE
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, записи kvstore и миниатюры, на '
+            'которые не ссылается ни один пост; с --dry-run только '
+            'перечисляет их')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Ничего не удалять, только показать')
+        parser.add_argument('--min-age', type=int, default=MEDIA_GC_MIN_AGE,
+                            help='Не трогать файлы моложе стольких секунд')
+
+    def handle(self, *args, **options):
+        dry_run, min_age = options['dry_run'], options['min_age']
+        self.verbosity = options['verbosity']
+        verb = 'Найдено' if dry_run else 'Удалено'
+        # исходники раньше миниатюр: их удаление освобождает и миниатюры
+        count = size = 0
+        for name, file_size in orphan_images(min_age):
+            self.report(name, dry_run)
+            if not dry_run:
+                delete_image(name)
+            count += 1
+            size += file_size
+        self.stdout.write(f'{verb} картинок: {count}, {size} байт')
+        if not has_kvstore():
+            # без таблицы kvstore любая миниатюра выглядела бы сиротой
+            self.stdout.write(self.style.WARNING(
+                'kvstore не в базе: его записи и миниатюры не проверяются'))
+            self.stdout.write(self.style.SUCCESS('Готово'))
+            return
+        count = 0
+        for image in orphan_sources():
+            self.report(image.name, dry_run)
+            if not dry_run:
+                delete_source(image)
+            count += 1
+        self.stdout.write(f'{verb} записей kvstore: {count}')
+        count = size = 0
+        for name, file_size in orphan_thumbnails(min_age):
+            self.report(name, dry_run)
+            if not dry_run:
+                delete_thumbnail(name)
+            count += 1
+            size += file_size
+        self.stdout.write(f'{verb} миниатюр: {count}, {size} байт')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def report(self, name, dry_run):
+        if dry_run or self.verbosity > 1:
+            self.stdout.write(f'  {name}')
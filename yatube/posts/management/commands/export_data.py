@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import (ENCODERS, EXPORTS, Export, format_watermark,
+                            parse_watermark)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты или комментарии в NDJSON или CSV потоком, '
+            'по возрастанию (дата, id). В конце печатает водяной знак, '
+            'с которого продолжить следующую выгрузку')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', default='ndjson',
+                            choices=sorted(ENCODERS))
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать на лету')
+        parser.add_argument('--after', metavar='ДАТА,ID',
+                            help='Только строки после водяного знака')
+        parser.add_argument('-o', '--output',
+                            help='Файл; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        after = options['after']
+        try:
+            after = parse_watermark(after) if after else None
+        except ValueError as error:
+            raise CommandError(error)
+        export = Export(options['kind'], options['format'], after,
+                        compress=options['gzip'])
+        output = options['output']
+        file = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            for chunk in export:
+                file.write(chunk)
+        finally:
+            if output:
+                file.close()
+            else:
+                file.flush()
+        watermark = export.watermark and format_watermark(export.watermark)
+        self.stderr.write(f'Строк: {export.rows}; водяной знак: '
+                          f'{watermark or "-"}')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.settings import TIMELINE_FANOUT_BATCH
+from posts.timeline import deliver_pending
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам подписок посты авторов с большим '
+            'числом подписчиков; с --loop работает как постоянный воркер')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int,
+                            default=TIMELINE_FANOUT_BATCH,
+                            help='Постов за проход')
+        parser.add_argument('--loop', action='store_true',
+                            help='Не выходить, ждать новых постов')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проходами пустой очереди, с')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            done = deliver_pending(options['batch'])
+            total += done
+            if done:
+                self.stdout.write(f'Разложено: {done}')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Постов разложено: {total}'))
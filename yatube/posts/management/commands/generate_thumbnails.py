@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.settings import THUMBNAIL_BATCH, THUMBNAIL_WORKERS
+from posts.thumbnails import process, process_pending
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры для новых картинок постов; '
+            'с --loop работает как постоянный воркер')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=THUMBNAIL_WORKERS,
+                            help='Потоков нарезки')
+        parser.add_argument('--batch', type=int, default=THUMBNAIL_BATCH,
+                            help='Картинок за проход')
+        parser.add_argument('--loop', action='store_true',
+                            help='Не выходить, ждать новых картинок')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проходами пустой очереди, с')
+        parser.add_argument('--all', action='store_true',
+                            help='Дорезать новые размеры у всех картинок, '
+                                 'не пряча готовые миниатюры')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            return self.process_all(options)
+        total = failed = 0
+        while True:
+            done, errors = process_pending(options['batch'],
+                                           options['workers'])
+            total += done
+            failed += errors
+            if done or errors:
+                self.stdout.write(f'Готово: {done}, ошибок: {errors}')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры нарезаны: {total}, ошибок: {failed}'))
+
+    def process_all(self, options):
+        # проход по id: готовые варианты sorl найдёт в kvstore и не режет
+        last = total = failed = 0
+        posts = Post.objects.filter(image__gt='').order_by('id')
+        while True:
+            rows = list(posts.filter(id__gt=last).values_list(
+                'id', 'image')[:options['batch']])
+            if not rows:
+                break
+            last = rows[-1][0]
+            done, errors = process([image for _, image in rows],
+                                   options['workers'])
+            total += done
+            failed += errors
+            self.stdout.write(f'До id={last}: готово {total}, '
+                              f'ошибок {failed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры нарезаны: {total}, ошибок: {failed}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount, recount_images
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики комментариев, записей, подписок '
+            'и ссылок на картинки')
+
+    def handle(self, *args, **options):
+        recount()
+        recount_images()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
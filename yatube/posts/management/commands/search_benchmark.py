@@ -0,0 +1,89 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Post, User
+from posts.search import has_fts, matching_ids, search_posts
+from posts.seeding import VOCABULARY, words
+from posts.settings import PAGINATOR_COUNT
+
+# слова встречаются по закону Ципфа: есть частые и редкие
+WORDS_PER_POST = 30
+
+
+def like_page(query):
+    """Как поиск без индекса: LIKE '%...%' и свежие первыми."""
+    return list(Post.objects.filter(text__icontains=query).select_related(
+        'author', 'group').order_by('-pub_date', '-id')[:PAGINATOR_COUNT])
+
+
+def like_count(query):
+    """COUNT(*) списка изменений админки при поиске через LIKE."""
+    return Post.objects.filter(text__icontains=query).count()
+
+
+def fts_page(query):
+    return list(search_posts(query))
+
+
+def fts_count(query):
+    return Post.objects.filter(id__in=matching_ids(query)).count()
+
+
+def timed(run, query):
+    start = time.perf_counter()
+    run(query)
+    return (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по индексу FTS5 с icontains на '
+            'сгенерированных постах: страница выдачи и COUNT админки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000,
+                            help='Сколько постов создать')
+        parser.add_argument('--queries', type=int, default=10,
+                            help='Сколько слов искать, от частых к редким')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not has_fts():
+            raise CommandError('Нужна SQLite с FTS5')
+        rng = random.Random(options['seed'])
+        vocabulary = words(rng)
+        # посты живут только внутри откатываемой транзакции
+        with transaction.atomic():
+            self.seed(rng, vocabulary, options['posts'])
+            self.stdout.write(
+                '{:<16} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    'word', 'matches', 'like page', 'fts page', 'like count',
+                    'fts count'))
+            totals = [0] * 4
+            for number in range(options['queries']):
+                # ранги слов растут геометрически: 1, ..., VOCABULARY
+                query = vocabulary[int(
+                    VOCABULARY ** (number / options['queries']))]
+                timings = [timed(run, query) for run in (
+                    like_page, fts_page, like_count, fts_count)]
+                totals = [total + timing
+                          for total, timing in zip(totals, timings)]
+                self.stdout.write(
+                    '{:<16} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} '
+                    '{:>10.2f}'.format(query, fts_count(query), *timings))
+            self.stdout.write('{:<16} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} '
+                              '{:>10.2f}'.format('total, ms', '', *totals))
+            transaction.set_rollback(True)
+
+    def seed(self, rng, vocabulary, posts):
+        author = User.objects.create_user(f'search-{uuid.uuid4().hex[:8]}')
+        weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+        # bulk_create обходит сигналы, но не триггеры индекса
+        Post.objects.bulk_create(
+            [Post(author=author, text=' '.join(rng.choices(
+                vocabulary, weights, k=WORDS_PER_POST)))
+             for _ in range(posts)],
+            batch_size=500)
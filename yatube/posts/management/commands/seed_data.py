@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.importer import Importer
+from posts.seeding import Seeder, numbered
+from posts.settings import IMPORT_BATCH
+from posts.thumbnails import process
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, подписки, посты, '
+            'комментарии и картинки с распределениями живого сообщества')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя в среднем')
+        parser.add_argument('--comments', type=float, default=2,
+                            help='Комментариев на пост в среднем')
+        parser.add_argument('--images', type=int, default=10,
+                            help='Сколько разных картинок создать')
+        parser.add_argument('--image-ratio', type=float, default=0.05,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--no-thumbnails', action='store_true',
+                            help='Не нарезать миниатюры сразу')
+        parser.add_argument('--batch', type=int, default=IMPORT_BATCH)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        seeder = Seeder(options['users'], options['posts'],
+                        options['groups'], options['follows'],
+                        options['comments'], options['image_ratio'],
+                        seed=options['seed'])
+        if options['images'] and options['image_ratio']:
+            seeder.make_images(options['images'])
+        importer = Importer(options['batch'])
+        # комментарии после постов: они читают id и даты из базы
+        for kind, rows in (('posts', seeder.post_rows),
+                           ('follows', seeder.follow_rows),
+                           ('comments', seeder.comment_rows)):
+            start = time.perf_counter()
+            written = importer.written
+            for _ in importer.run(kind, numbered(rows())):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{kind}: {importer.written - written}')
+            self.stdout.write('{}: {}, {:.1f} с'.format(
+                kind, importer.written - written,
+                time.perf_counter() - start))
+        start = time.perf_counter()
+        importer.finish()
+        self.stdout.write(f'Счётчики и ленты: '
+                          f'{time.perf_counter() - start:.1f} с')
+        if seeder.images and not options['no_thumbnails']:
+            process(seeder.images)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: пользователей {importer.users.created}, '
+            f'групп {importer.groups.created}'))
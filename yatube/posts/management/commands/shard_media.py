@@ -0,0 +1,94 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from posts.models import Post, StoredImage
+from posts.page_cache import invalidate_post_pages
+from posts.settings import MEDIA_SHARD_BATCH, THUMBNAIL_WORKERS
+from posts.storage import is_sharded, post_images
+from posts.thumbnails import delete_unused, process
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в шардированные каталоги по хешу '
+            'и переписывает Post.image пачками. Перенос идемпотентен: '
+            'прерванный запуск продолжается с --after')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=MEDIA_SHARD_BATCH,
+                            help='Файлов за пачку')
+        parser.add_argument('--after', default='',
+                            help='Начать с файла после этого имени')
+        parser.add_argument('--workers', type=int, default=THUMBNAIL_WORKERS,
+                            help='Потоков нарезки миниатюр')
+        parser.add_argument('--no-thumbnails', action='store_true',
+                            help='Оставить нарезку воркеру '
+                                 'generate_thumbnails')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать файлы к переносу')
+
+    def handle(self, *args, **options):
+        # проход по индексу post_image_idx: каждое имя один раз
+        names = (Post.objects
+                 .filter(image__gt='')
+                 .order_by('image')
+                 .values_list('image', flat=True)
+                 .distinct())
+        last = options['after']
+        moved = missing = 0
+        while True:
+            batch = list(names.filter(image__gt=last)[:options['batch']])
+            if not batch:
+                break
+            last = batch[-1]
+            done = []
+            for name in batch:
+                if is_sharded(name):
+                    continue
+                new = (self.exists(name) and name if options['dry_run']
+                       else self.move(name))
+                if new:
+                    done.append(new)
+                else:
+                    missing += 1
+            if done and not options['dry_run'] and \
+                    not options['no_thumbnails']:
+                process(done, options['workers'])
+            moved += len(done)
+            self.stdout.write(f'До {last}: перенесено {moved}, '
+                              f'нет файла {missing}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"К переносу" if options["dry_run"] else "Перенесено"}: '
+            f'{moved}, нет файла: {missing}'))
+
+    def exists(self, name):
+        try:
+            return post_images.exists(name)
+        except SuspiciousFileOperation:
+            return False
+
+    def move(self, name):
+        """Копирует файл под имя по хешу и переводит на него посты."""
+        try:
+            with post_images.open(name) as source:
+                new = post_images.save(name, source)
+        except (OSError, SuspiciousFileOperation):
+            return None
+        with transaction.atomic():
+            posts = Post.objects.filter(image=name)
+            ids = list(posts.values_list('id', flat=True))
+            # update мимо сигналов: ссылки переносятся здесь же
+            posts.filter(id__in=ids).update(
+                image=new, thumbnails_ready=False, version=F('version') + 1)
+            stored, created = StoredImage.objects.get_or_create(
+                name=new, defaults={'refs': len(ids)})
+            if not created:
+                StoredImage.objects.filter(name=new).update(
+                    refs=F('refs') + len(ids))
+            StoredImage.objects.update_or_create(
+                name=name, defaults={'refs': 0})
+            # старый файл и его миниатюры уходят после коммита
+            transaction.on_commit(lambda: delete_unused(name))
+        invalidate_post_pages(*ids)
+        return new
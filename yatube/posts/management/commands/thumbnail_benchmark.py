@@ -0,0 +1,114 @@
+import tempfile
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts.models import Post, User
+from posts.settings import PAGINATOR_COUNT, THUMBNAIL_SIZES
+from posts.thumbnails import (cached_thumbnail, prefetch_thumbnails,
+                              process_pending, thumbnail_file)
+
+
+@contextmanager
+def counting(cache, methods=('get', 'get_many', 'set', 'set_many')):
+    """Считает обращения к кэшу kvstore.
+
+    Вложенные вызовы не считаются: get_many у LocMemCache — это цикл get.
+    """
+    calls = []
+    depth = [0]
+
+    def wrap(method):
+        def wrapper(*args, **kwargs):
+            if not depth[0]:
+                calls.append(method.__name__)
+            depth[0] += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return wrapper
+
+    for name in methods:
+        setattr(cache, name, wrap(getattr(cache, name)))
+    try:
+        yield calls
+    finally:
+        for name in methods:
+            delattr(cache, name)
+
+
+def per_post(posts):
+    """Как шаблон без предвыборки: поиск в kvstore на каждый пост."""
+    for post in posts:
+        for size in THUMBNAIL_SIZES:
+            cached_thumbnail(post.image, size)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск миниатюр страницы по одной и пачкой: '
+            'запросы к базе при холодном кэше и время')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=PAGINATOR_COUNT,
+                            help='Постов с картинками на странице')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Повторов замера')
+
+    def handle(self, *args, **options):
+        # картинки и записи живут во временном каталоге и транзакции
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media), \
+                transaction.atomic():
+            posts = self.seed(options['posts'])
+            keys = [add_prefix(thumbnail_file(post.image, size).key)
+                    for post in posts for size in THUMBNAIL_SIZES]
+            self.stdout.write('{:<9} {:>13} {:>12} {:>11} {:>11}'.format(
+                'lookup', 'cold queries', 'cache calls', 'cold ms',
+                'warm ms'))
+            try:
+                for name, lookup in [('per-post', per_post),
+                                     ('batched', prefetch_thumbnails)]:
+                    self.stdout.write(
+                        '{:<9} {:>13} {:>12} {:>11.2f} {:>11.2f}'.format(
+                            name, *self.measure(lookup, posts, keys,
+                                                options['repeat'])))
+            finally:
+                default.kvstore.cache.delete_many(keys)
+                transaction.set_rollback(True)
+
+    def seed(self, count):
+        author = User.objects.create_user('thumbnail-benchmark')
+        for number in range(count):
+            image = BytesIO()
+            Image.new('RGB', (1200, 800), (number * 20 % 256, 0, 0)).save(
+                image, 'JPEG')
+            Post.objects.create(
+                text=f'benchmark-{number}', author=author,
+                image=ContentFile(image.getvalue(), f'bench-{number}.jpg'))
+        process_pending(batch=count, workers=1)
+        return list(author.posts.all())
+
+    def measure(self, lookup, posts, keys, repeat):
+        cold = warm = 0
+        for _ in range(repeat):
+            default.kvstore.cache.delete_many(keys)
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                lookup(posts)
+            cold += time.perf_counter() - start
+            start = time.perf_counter()
+            lookup(posts)
+            warm += time.perf_counter() - start
+        with counting(default.kvstore.cache) as calls:
+            lookup(posts)
+        return (len(queries), len(calls),
+                cold / repeat * 1000, warm / repeat * 1000)
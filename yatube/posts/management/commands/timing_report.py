@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from yatube import timing
+
+
+class Command(BaseCommand):
+    help = ('Сводка Server-Timing по страницам: запросы, среднее время '
+            'ответа, базы, шаблонов и кэша, попадания в кэш')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить сводку после вывода')
+
+    def handle(self, *args, **options):
+        rows = sorted(timing.report().items(),
+                      key=lambda item: item[1]['total'], reverse=True)
+        self.stdout.write(
+            '{:<36} {:>8} {:>9} {:>8} {:>8} {:>8} {:>9} {:>7}'.format(
+                'view', 'requests', 'total, ms', 'db, ms', 'queries',
+                'tpl, ms', 'cache, ms', 'hit, %'))
+        for name, values in rows:
+            requests = values['requests'] or 1
+            reads = values['hits'] + values['misses']
+            self.stdout.write(
+                '{:<36} {:>8} {:>9.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>9.1f} '
+                '{:>7}'.format(
+                    name, values['requests'],
+                    values['total'] * 1000 / requests,
+                    values['db'] * 1000 / requests,
+                    values['queries'] / requests,
+                    values['template'] * 1000 / requests,
+                    values['cache'] * 1000 / requests,
+                    round(values['hits'] * 100 / reads) if reads else '-'))
+        if options['reset']:
+            timing.reset()
@@ -0,0 +1,174 @@
+"""Отдача картинок постов и миниатюр в продакшене.
+
+Файл проверяется здесь, а байты передаёт фронтенд (X-Sendfile,
+X-Accel-Redirect) или wsgi.file_wrapper сервера через os.sendfile.
+Поддерживаются один диапазон Range, ETag и Last-Modified; у файлов
+по хешу ETag — сам хеш.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from .models import Post
+from .settings import (MEDIA_BLOCK_SIZE, MEDIA_IMMUTABLE_MAX_AGE,
+                       MEDIA_MAX_AGE)
+from .storage import is_sharded, post_images
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_dirs():
+    """Каталоги MEDIA_ROOT, которые можно отдавать."""
+    return (Post._meta.get_field('image').upload_to,
+            sorl_settings.THUMBNAIL_PREFIX)
+
+
+def parse_range(header, size):
+    """Первый и последний байт диапазона или None, если отдать всё.
+
+    ValueError — диапазон целиком за концом файла.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # несколько диапазонов или мусор: по RFC 7233 можно отдать всё
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if not suffix:
+            raise ValueError(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last) if last else size - 1, size - 1)
+
+
+class FileRange:
+    """Окно файла для потоковой отдачи.
+
+    fileno и tell остаются у файла: wsgi.file_wrapper сервера отправит
+    окно через os.sendfile, ограничившись Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class MediaResponse(FileResponse):
+    block_size = MEDIA_BLOCK_SIZE
+
+
+def stream(request, path, size, etag, last_modified):
+    """Файл или его диапазон из Django."""
+    span = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range с другой версией файла: диапазон устарел, нужен весь файл
+    if header and if_range in (None, etag, last_modified):
+        try:
+            span = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    start, end = span or (0, size - 1)
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        # файл удалили между stat и open
+        raise Http404
+    response = MediaResponse(FileRange(file, start, end - start + 1))
+    # FileResponse ставит размер всего файла
+    response['Content-Length'] = end - start + 1
+    if span:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def sendfile(name, path):
+    """Пустой ответ: файл отдаст фронтенд по заголовку."""
+    response = HttpResponse(content_type=mimetypes.guess_type(name)[0]
+                            or 'application/octet-stream')
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (settings.MEDIA_ACCEL_PREFIX
+                                        + quote(name))
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+@require_safe
+def serve(request, path):
+    name = posixpath.normpath(path)
+    if (name != path or not name.startswith(media_dirs())
+            or any(part.startswith('.') for part in name.split('/'))):
+        raise Http404
+    try:
+        full_path = post_images.path(name)
+        stats = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404
+    if is_sharded(name):
+        # имя — sha256 содержимого, а время изменения сдвигает каждая
+        # повторная загрузка того же файла (ContentAddressedStorage.save)
+        etag = '"{}"'.format(posixpath.splitext(posixpath.basename(name))[0])
+        modified = last_modified = None
+    else:
+        etag = '"{:x}-{:x}"'.format(stats.st_mtime_ns, stats.st_size)
+        modified = int(stats.st_mtime)
+        last_modified = http_date(modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified)
+    if response is None:
+        response = (sendfile(name, full_path) if settings.MEDIA_SENDFILE
+                    else stream(request, full_path, stats.st_size, etag,
+                                last_modified))
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = last_modified
+    # имена по хешу не переиспользуются: такой файл не изменится
+    if is_sharded(name) or name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=MEDIA_IMMUTABLE_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response
@@ -0,0 +1,133 @@
+"""Сборка мусора в медиа: файлы и записи kvstore sorl без живых постов.
+
+Всё идёт потоком пачками по MEDIA_GC_CHUNK: каталоги обходятся через
+os.scandir, kvstore — по возрастанию ключа, а живые Post.image
+проверяются одним запросом на пачку по индексу post_image_idx. Память не
+зависит от числа файлов.
+
+Файлы моложе MEDIA_GC_MIN_AGE не трогаются: загрузка ложится на диск
+раньше, чем коммитится её пост.
+"""
+import os
+import time
+from itertools import islice
+
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .models import Post, StoredImage
+from .settings import MEDIA_GC_CHUNK, MEDIA_GC_MIN_AGE
+from .storage import post_images
+from .thumbnails import source
+
+
+def chunks(iterable, size=MEDIA_GC_CHUNK):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _scan(path):
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def walk(storage, directory, min_age=MEDIA_GC_MIN_AGE):
+    """Файлы каталога хранилища старше min_age: (имя, размер)."""
+    cutoff = time.time() - min_age
+    for entry in _scan(storage.path(directory)):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime < cutoff:
+            name = os.path.relpath(entry.path, storage.location)
+            yield name.replace(os.sep, '/'), stat.st_size
+
+
+def live_images(names):
+    """Какие из имён сейчас у постов."""
+    return set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True))
+
+
+def orphan_images(min_age=MEDIA_GC_MIN_AGE):
+    """Картинки в каталоге upload_to, на которые не ссылается ни один пост."""
+    directory = Post._meta.get_field('image').upload_to
+    for chunk in chunks(walk(post_images, directory, min_age)):
+        live = live_images([name for name, _ in chunk])
+        yield from ((name, size) for name, size in chunk
+                    if name not in live)
+
+
+def delete_image(name):
+    """Удаляет картинку вместе с миниатюрами и счётчиком ссылок."""
+    delete(source(name))
+    StoredImage.objects.filter(name=name).delete()
+
+
+def has_kvstore():
+    """kvstore лежит в таблице, и его можно обойти по ключам."""
+    return isinstance(default.kvstore, CachedDBStore)
+
+
+def _kvstore_images():
+    """Записи об исходных картинках в kvstore, по ключу."""
+    prefix = add_prefix('', 'image')
+    rows = KVStore.objects.filter(key__startswith=prefix).order_by('key')
+    last = prefix
+    while True:
+        chunk = list(rows.filter(key__gt=last).values_list(
+            'key', 'value')[:MEDIA_GC_CHUNK])
+        if not chunk:
+            return
+        last = chunk[-1][0]
+        images = [deserialize_image_file(value) for _, value in chunk]
+        # миниатюры удаляются вместе со своими исходниками
+        yield [image for image in images
+               if not image.name.startswith(sorl_settings.THUMBNAIL_PREFIX)]
+
+
+def orphan_sources():
+    """Исходники в kvstore без живого поста или от прежнего хранилища."""
+    current = source('-').serialize_storage()
+    for images in _kvstore_images():
+        live = live_images([image.name for image in images])
+        yield from (image for image in images
+                    if image.name not in live
+                    or image.serialize_storage() != current)
+
+
+def delete_source(image):
+    """Удаляет запись исходника, его миниатюры и их файлы; сам файл — нет."""
+    default.kvstore.delete(image)
+
+
+def orphan_thumbnails(min_age=MEDIA_GC_MIN_AGE):
+    """Файлы миниатюр, которых нет в kvstore; без kvstore в базе — ничего."""
+    if not has_kvstore():
+        return
+    storage = default.storage
+    for chunk in chunks(walk(storage, sorl_settings.THUMBNAIL_PREFIX,
+                             min_age)):
+        keys = {add_prefix(ImageFile(name, storage).key): (name, size)
+                for name, size in chunk}
+        known = set(KVStore.objects.filter(key__in=keys).values_list(
+            'key', flat=True))
+        yield from (item for key, item in keys.items() if key not in known)
+
+
+def delete_thumbnail(name):
+    default.storage.delete(name)
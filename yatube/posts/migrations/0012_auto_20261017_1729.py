@@ -0,0 +1,17 @@
+# Generated by Django 2.2.19 on 2026-10-17 17:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_auto_20210815_1424'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ['-pub_date', '-id'], 'verbose_name': 'Посты', 'verbose_name_plural': 'Посты'},
+        ),
+    ]
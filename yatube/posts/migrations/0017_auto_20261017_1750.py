@@ -0,0 +1,29 @@
+# Generated by Django 2.2.19 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # старые картинки уже отдавались через ленивый {% thumbnail %}
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(thumbnails_ready=False), fields=['id'], name='post_thumbnails_pending_idx'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.19 on 2026-10-17 18:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import posts.storage
+
+
+def count_image_refs(apps, schema_editor):
+    # копия posts.counters.recount_images на момент миграции
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    names = (Post.objects
+             .filter(image__gt='')
+             .order_by()
+             .values_list('image', flat=True)
+             .distinct())
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=name) for name in names.iterator()],
+        batch_size=500)
+    refs = (Post.objects
+            .filter(image=OuterRef('pk'))
+            .order_by()
+            .values('image')
+            .annotate(total=Count('pk'))
+            .values('total'))
+    StoredImage.objects.update(refs=Coalesce(Subquery(refs), 0))
+
+
+# Ключ миниатюр sorl включает класс хранилища, так что прежние миниатюры
+# больше не находятся. Миграция не ставит все картинки в очередь: их
+# дорезает по частям generate_thumbnails --all, когда удобно.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_auto_20261017_1750'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+        migrations.RunPython(count_image_refs, migrations.RunPython.noop),
+    ]
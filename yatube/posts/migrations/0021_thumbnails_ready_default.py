@@ -0,0 +1,27 @@
+# Generated by Django 2.2.19 on 2026-10-17 19:08
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def dequeue_text_posts(apps, schema_editor):
+    # посты без картинки раздували очередь и частичный индекс до всей таблицы
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(Q(image__isnull=True) | Q(image='')).update(
+        thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_created_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.RunPython(dequeue_text_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.19 on 2026-10-17 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_thumbnails_ready_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='timeline_pending',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ждёт раскладки по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(timeline_pending=True), fields=['author', 'id'], name='post_timeline_pending_idx'),
+        ),
+    ]
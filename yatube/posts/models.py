@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -36,15 +38,55 @@ class Post(models.Model):
                               blank=True,
                               null=True,
                               verbose_name='Группа')
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/',
+                              storage=post_images,
+                              blank=True,
+                              null=True)
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев')
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия')
+    # True у поста, который ждёт fan_out_posts: подписчиков много
+    timeline_pending = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Ждёт раскладки по лентам')
+    # False только у поста с картинкой, ждущей generate_thumbnails
+    thumbnails_ready = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Миниатюры готовы')
 
     def __str__(self):
         return self.text
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Посты'
         verbose_name_plural = 'Посты'
+        # ленты: общая, автора и группы — в порядке ordering
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            # очередь картинок, ждущих миниатюр
+            models.Index(fields=['id'],
+                         condition=models.Q(thumbnails_ready=False),
+                         name='post_thumbnails_pending_idx'),
+            # очередь раскладки по лентам; по автору — для ленты подписок
+            models.Index(fields=['author', 'id'],
+                         condition=models.Q(timeline_pending=True),
+                         name='post_timeline_pending_idx'),
+            # посты с файлом: счёт ссылок на него
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -69,6 +111,13 @@ class Comment(models.Model):
         ordering = ['created']
         verbose_name = 'Комментарии'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            # список комментариев в админке, свежие первыми
+            models.Index(fields=['-created', '-id'],
+                         name='comment_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -87,3 +136,71 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['author', 'user'],
                                     name="unique_followers")
         ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые ведут сигналы posts.signals"""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats',
+                                verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='Записей')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписок')
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок читателя"""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Читатель')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Пост')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        verbose_name = 'Лента подписок'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class StoredImage(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются"""
+    name = models.CharField(max_length=100,
+                            primary_key=True,
+                            verbose_name='Файл')
+    refs = models.PositiveIntegerField(default=0,
+                                       verbose_name='Ссылок')
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
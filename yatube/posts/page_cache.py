@@ -0,0 +1,64 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+
+from .models import Post
+from .settings import PAGE_CACHE_PARAMS, PAGE_CACHE_TIMEOUT
+
+
+def _scope_key(scope):
+    return 'page_scope:' + hashlib.md5(scope.encode()).hexdigest()
+
+
+def scope_versions(scopes):
+    """Текущие версии областей; отсутствующие заводятся заново."""
+    keys = [_scope_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_pages(*scopes):
+    """Сбрасывает кэш гостевых страниц, зависящих от областей."""
+    cache.delete_many([_scope_key(scope) for scope in scopes if scope])
+
+
+def invalidate_post_pages(*post_ids):
+    """Сбрасывает гостевые страницы авторов и групп постов."""
+    for username, slug in Post.objects.filter(pk__in=post_ids).values_list(
+            'author__username', 'group__slug'):
+        invalidate_pages(username and f'author:{username}',
+                         slug and f'group:{slug}')
+
+
+def anonymous_page_cache(*scopes):
+    """Кэширует страницу для гостей до инвалидации её областей.
+
+    Области — шаблоны строк вроде 'group:{slug}', они заполняются
+    аргументами view. Авторизованные запросы идут мимо кэша.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            params = [(name, request.GET.get(name))
+                      for name in PAGE_CACHE_PARAMS if name in request.GET]
+            versions = scope_versions(
+                [scope.format(**kwargs) for scope in scopes])
+            raw = repr((request.path, params, versions)).encode()
+            key = 'anonymous_page:' + hashlib.md5(raw).hexdigest()
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies:
+                    cache.set(key, response, PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
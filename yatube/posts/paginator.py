@@ -0,0 +1,234 @@
+import base64
+import binascii
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .settings import (PAGINATOR_COUNT, PAGINATOR_COUNT_TIMEOUT,
+                       PAGINATOR_EXACT_COUNT_LIMIT, PAGINATOR_ON_EACH_SIDE,
+                       PAGINATOR_ON_ENDS)
+
+# Порядок ленты: id разрешает совпадения pub_date
+CURSOR_ORDERING = ('-pub_date', '-id')
+# Версии счётчиков по областям: index, group:<id>, author:<id>,
+# follow:<id пользователя>. Запись сбрасывает только свои области.
+COUNT_VERSION_PREFIX = 'feed_count_version:'
+INDEX_SCOPE = 'index'
+
+
+def _count_key(scope):
+    return COUNT_VERSION_PREFIX + scope
+
+
+def feed_counts_versions(scopes):
+    """Текущие версии счётчиков областей; отсутствующие заводятся заново."""
+    keys = [_count_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def invalidate_feed_counts(*scopes):
+    """Сбрасывает точные счётчики лент этих областей."""
+    cache.delete_many([_count_key(scope) for scope in scopes if scope])
+
+
+def encode_cursor(post):
+    """Непрозрачный токен позиции поста в ленте."""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает пару (pub_date, id) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница без номера: соседи известны только через курсор."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без LIMIT/OFFSET.
+
+    Стоимость страницы не зависит от её глубины: каждая выборка —
+    это диапазон индекса от курсора плюс per_page + 1 строк.
+    """
+
+    def get_cursor_page(self, after=None, before=None):
+        # явный order_by выборки (дата, id) по убыванию задаёт поля курсора
+        ordering = tuple(self.object_list.query.order_by) or CURSOR_ORDERING
+        date_field, pk_field = (field.lstrip('-') for field in ordering)
+        queryset = self.object_list.order_by(*ordering)
+        limit = self.per_page + 1
+        cursor = decode_cursor(before) if before else None
+        if cursor is not None:
+            pub_date, pk = cursor
+            rows = list(queryset.filter(
+                Q(**{f'{date_field}__gt': pub_date})
+                | Q(**{date_field: pub_date, f'{pk_field}__gt': pk})
+            ).reverse()[:limit])
+            if rows:
+                return CursorPage(rows[:self.per_page][::-1], self,
+                                  has_next=True,
+                                  has_previous=len(rows) == limit)
+        cursor = decode_cursor(after) if after else None
+        if cursor is not None:
+            pub_date, pk = cursor
+            rows = list(queryset.filter(
+                Q(**{f'{date_field}__lt': pub_date})
+                | Q(**{date_field: pub_date, f'{pk_field}__lt': pk})
+            )[:limit])
+            if rows:
+                return CursorPage(rows[:self.per_page], self,
+                                  has_next=len(rows) == limit,
+                                  has_previous=True)
+        # курсор за краем ленты или соседи удалены: первая страница
+        rows = list(queryset[:limit])
+        return CursorPage(rows[:self.per_page], self,
+                          has_next=len(rows) == limit,
+                          has_previous=False)
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор ленты с кэшированным COUNT и окном номеров страниц.
+
+    COUNT живёт до сброса любой из областей scopes.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, *args,
+                 scopes=(INDEX_SCOPE,), **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        self.scopes = scopes
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        # ключ по выборке id: select_related и поля не меняют COUNT
+        query = self.object_list.values_list('pk').query
+        sql = str(query.sql_with_params()).encode()
+        key = 'feed_count:' + hashlib.md5(sql).hexdigest()
+        version = feed_counts_versions(self.scopes)
+        cached = cache.get(key)
+        if cached is not None:
+            count, cached_version = cached
+            if (cached_version == version
+                    or count > PAGINATOR_EXACT_COUNT_LIMIT):
+                return count
+        count = super().count
+        cache.set(key, (count, version), PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_elided_page_range(self, number=1, *,
+                              on_each_side=PAGINATOR_ON_EACH_SIDE,
+                              on_ends=PAGINATOR_ON_ENDS):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1,
+                             self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+def estimated_rows(model, using):
+    """Число строк таблицы по статистике планировщика или None.
+
+    Статистику собирают ANALYZE/autovacuum; без неё оценки нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class '
+                               'WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                # первое число stat — строки индекса; у частичного их
+                # меньше, чем в таблице, поэтому берётся наибольшее
+                cursor.execute('SELECT stat FROM sqlite_stat1 '
+                               'WHERE tbl = %s', [table])
+            else:
+                return None
+            stats = cursor.fetchall()
+    except DatabaseError:
+        return None
+    if not stats:
+        return None
+    rows = max(int(str(stat).split()[0].split('.')[0]) for stat, in stats)
+    return rows if rows >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Счёт строк для больших таблиц: оценка вместо COUNT(*).
+
+    Без фильтров длинная таблица считается по статистике планировщика,
+    остальное — точным COUNT. Кэш счётчиков лент сюда не подходит: он
+    сбрасывается только записями постов и подписок.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            rows = estimated_rows(query.model, self.object_list.db)
+            if rows is not None and rows > PAGINATOR_EXACT_COUNT_LIMIT:
+                return rows
+        return super().count
+
+
+def paginate(request, object_list, per_page=PAGINATOR_COUNT,
+             scopes=(INDEX_SCOPE,)):
+    """Страница ленты по параметрам запроса: курсор или номер.
+
+    scopes — области, записи в которых меняют длину ленты.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        paginator = CursorPaginator(object_list, per_page)
+        return paginator.get_cursor_page(after=after, before=before)
+    paginator = FeedPaginator(object_list, per_page, scopes=scopes)
+    return paginator.get_page(request.GET.get('page'))
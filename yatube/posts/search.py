@@ -0,0 +1,172 @@
+"""Полнотекстовый поиск по постам на индексе SQLite FTS5.
+
+posts_post_fts хранит только инвертированный индекс: текст лежит в
+posts_post (external content), а синхронизацию ведут триггеры на
+вставку, правку и удаление, поэтому её не обходят ни update(), ни
+bulk_create. Результаты ранжируются по bm25 и листаются курсором по
+(ранг, id). Без FTS5 поиск сводится к icontains.
+"""
+import base64
+import binascii
+import re
+from functools import lru_cache
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginator import CursorPage
+from .settings import PAGINATOR_COUNT, SEARCH_MAX_TERMS
+
+FTS_TABLE = 'posts_post_fts'
+FTS_SCHEMA = [
+    # регистр не важен; remove_diacritics сводит «é» к «e», но не «ё» к «е»
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+    f"AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+    f"AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    f"AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+]
+FTS_TRIGGERS = 3
+
+
+@lru_cache(maxsize=None)
+def has_fts(alias=DEFAULT_DB_ALIAS):
+    """Есть ли у базы FTS5; сборка SQLite за время работы не меняется."""
+    using = connections[alias]
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def ensure_index(using=connection):
+    """Создаёт индекс и триггеры, если их нет; True, если поиск на FTS5.
+
+    SQLite пересоздаёт таблицу при изменении полей, и триггеры при этом
+    теряются: тогда они возвращаются, а индекс перестраивается.
+    """
+    if not has_fts(using.alias):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post' AND name LIKE %s",
+            [f'{FTS_TABLE}%'])
+        if cursor.fetchone()[0] == FTS_TRIGGERS:
+            return True
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательской строки: все слова, последнее — префикс.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 в строке не работает.
+    """
+    terms = re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+class InSubquery(RawSQL):
+    """Сырой подзапрос для __in: скобки ставит сам lookup.
+
+    RawSQL в скобках превратил бы IN ((SELECT ...)) в сравнение
+    с одним скалярным значением.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching_ids(query):
+    """Подзапрос id постов, в которых есть все слова запроса."""
+    return InSubquery(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+                      f'MATCH %s', [match_expression(query)])
+
+
+def encode_cursor(rank, pk):
+    """Непрозрачный токен позиции в выдаче."""
+    raw = f'{rank!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Пара (ранг, id) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        rank, pk = raw.decode().split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _fts_rows(expression, cursor, backward, limit):
+    # bm25 тем меньше, чем лучше совпадение; при равенстве — новее выше
+    sql = (f'SELECT rank, rowid FROM {FTS_TABLE} '
+           f'WHERE {FTS_TABLE} MATCH %s')
+    params = [expression]
+    if cursor is not None:
+        sql += (' AND (rank {0} %s OR (rank = %s AND rowid {1} %s))'.format(
+            *('<', '>') if backward else ('>', '<')))
+        params += [cursor[0], cursor[0], cursor[1]]
+    sql += (' ORDER BY rank DESC, rowid' if backward
+            else ' ORDER BY rank, rowid DESC') + ' LIMIT %s'
+    with connection.cursor() as db:
+        db.execute(sql, params + [limit])
+        return db.fetchall()
+
+
+def _like_rows(query, cursor, backward, limit):
+    # без индекса все совпадения равны: новые посты выше
+    posts = Post.objects.filter(text__icontains=query)
+    if cursor is not None:
+        posts = posts.filter(Q(id__gt=cursor[1]) if backward
+                             else Q(id__lt=cursor[1]))
+    ids = posts.order_by('id' if backward else '-id').values_list(
+        'id', flat=True)[:limit]
+    return [(0.0, pk) for pk in ids]
+
+
+def search_posts(query, after=None, before=None, per_page=PAGINATOR_COUNT):
+    """Страница выдачи по запросу; у страницы есть курсоры соседей."""
+    cursor = decode_cursor(before or after or '')
+    backward = bool(before) and cursor is not None
+    expression = match_expression(query)
+    rows = []
+    if expression and has_fts():
+        rows = _fts_rows(expression, cursor, backward, per_page + 1)
+    elif expression:
+        rows = _like_rows(query.strip(), cursor, backward, per_page + 1)
+    if not rows and cursor is not None:
+        # курсор за краем выдачи: первая страница
+        return search_posts(query, per_page=per_page)
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for _, pk in rows])
+    page = CursorPage([posts[pk] for _, pk in rows if pk in posts], None,
+                      has_next=more or backward,
+                      has_previous=more if backward else cursor is not None)
+    page.next_cursor = rows and encode_cursor(*rows[-1])
+    page.previous_cursor = rows and encode_cursor(*rows[0])
+    return page
@@ -0,0 +1,167 @@
+"""Синтетические данные для замеров на больших объёмах.
+
+Распределения похожи на живое сообщество: подписки и авторство
+подчиняются степенному закону (немногие популярные авторы собирают
+большинство подписчиков и постов), посты идут всплесками, у немногих
+постов длинные обсуждения, у части постов есть картинки.
+
+Строки отдаются потоками в формате bulk_import и пишутся Importer,
+так что память не зависит от масштаба, а счётчики и ленты
+приводятся в порядок так же, как при импорте.
+"""
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from .models import Post
+from .settings import EXPORT_CHUNK
+from .storage import post_images
+
+SYLLABLES = ('ба', 'ве', 'ги', 'до', 'жу', 'зя', 'ка', 'ле', 'ми', 'но',
+             'пу', 'ры', 'са', 'ти', 'фо', 'хе', 'цу', 'ча', 'шо', 'эм')
+VOCABULARY = 5000
+# Показатели степенных законов: популярность авторов и групп, число
+# подписок и комментариев
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 1.5
+# Всплески активности автора: сколько их и разброс постов вокруг
+BURSTS_PER_AUTHOR = 5
+BURST_HOURS = 6
+PERIOD_DAYS = 365
+GROUP_RATIO = 0.3
+
+
+def words(rng, size=VOCABULARY):
+    """Словарь из разных слов по 3-5 слогов."""
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(''.join(rng.choices(SYLLABLES, k=rng.randint(3, 5))))
+    return sorted(vocabulary)
+
+
+def zipf_weights(size, exponent=ZIPF_EXPONENT):
+    """Накопленные веса: k-й по популярности встречается как 1/k^s."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+def pareto(rng, mean, limit):
+    """Целое с тяжёлым хвостом и заданным средним, не больше limit."""
+    scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+    return min(int(scale * rng.paretovariate(PARETO_ALPHA)), limit)
+
+
+def username(number):
+    return f'seed-{number}'
+
+
+class Seeder:
+    """Генератор строк для Importer при заданном масштабе."""
+
+    def __init__(self, users, posts, groups, follows, comments,
+                 image_ratio, seed=1):
+        self.users = users
+        self.posts = posts
+        self.groups = groups
+        self.follows = follows
+        self.comments = comments
+        self.image_ratio = image_ratio
+        self.rng = random.Random(seed)
+        self.vocabulary = words(self.rng)
+        self.word_weights = zipf_weights(len(self.vocabulary))
+        self.user_weights = zipf_weights(users)
+        self.group_weights = zipf_weights(groups) if groups else None
+        self.now = timezone.now()
+        self.bursts = {}
+        self.images = []
+        self.first_id = None
+
+    def text(self, length):
+        return ' '.join(self.rng.choices(
+            self.vocabulary, cum_weights=self.word_weights, k=length))
+
+    def author(self):
+        # ранг популярности 0 — самый популярный автор
+        return self.rng.choices(range(self.users),
+                                cum_weights=self.user_weights)[0]
+
+    def moment(self, author):
+        """Время поста: около одного из всплесков автора."""
+        bursts = self.bursts.get(author)
+        if bursts is None:
+            bursts = self.bursts[author] = [
+                self.rng.uniform(0, PERIOD_DAYS * 24)
+                for _ in range(BURSTS_PER_AUTHOR)]
+        hours = (self.rng.choice(bursts)
+                 + self.rng.expovariate(1 / BURST_HOURS))
+        return self.now - timedelta(hours=min(hours, PERIOD_DAYS * 24))
+
+    def make_images(self, count):
+        """Несколько картинок в хранилище: на них ссылаются посты."""
+        for number in range(count):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+            self.images.append(post_images.save(
+                f'posts/seed-{number}.jpg', ContentFile(buffer.getvalue())))
+        return self.images
+
+    def post_rows(self):
+        first = self.first_id = (
+            Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        for post_id in range(first, first + self.posts):
+            author = self.author()
+            row = {'id': post_id,
+                   'text': self.text(self.rng.randint(5, 60)),
+                   'author': username(author),
+                   'pub_date': self.moment(author).isoformat()}
+            if self.groups and self.rng.random() < GROUP_RATIO:
+                row['group'] = 'seed-group-{}'.format(self.rng.choices(
+                    range(self.groups), cum_weights=self.group_weights)[0])
+            if self.images and self.rng.random() < self.image_ratio:
+                row['image'] = self.rng.choice(self.images)
+            yield row
+
+    def follow_rows(self):
+        """Каждый подписан на pareto() авторов, выбранных по популярности."""
+        for user in range(self.users):
+            count = pareto(self.rng, self.follows, self.users - 1)
+            authors = set(self.rng.choices(
+                range(self.users), cum_weights=self.user_weights, k=count))
+            authors.discard(user)
+            for author in sorted(authors):
+                yield {'user': username(user), 'author': username(author)}
+
+    def comment_rows(self):
+        """Комментарии к созданным постам: у немногих — сотни."""
+        limit = max(int(self.comments * 100), 1)
+        for post_id, pub_date in seeded_posts(self.first_id):
+            for _ in range(pareto(self.rng, self.comments, limit)):
+                yield {'post': post_id,
+                       'text': self.text(self.rng.randint(3, 30)),
+                       'author': username(self.author()),
+                       'created': (pub_date + timedelta(
+                           minutes=self.rng.expovariate(1 / 60))).isoformat()}
+
+
+def seeded_posts(first_id):
+    """(id, дата) постов начиная с first_id, пачками по id."""
+    last = first_id - 1
+    while True:
+        batch = list(Post.objects.filter(id__gt=last).order_by(
+            'id').values_list('id', 'pub_date')[:EXPORT_CHUNK])
+        if not batch:
+            return
+        last = batch[-1][0]
+        yield from batch
+
+
+def numbered(rows):
+    """Строки в виде, в котором их отдают читатели bulk_import."""
+    return enumerate(rows, 1)
@@ -1 +1,70 @@
 PAGINATOR_COUNT = 10
+# Сколько номеров страниц показывать вокруг текущей и по краям
+PAGINATOR_ON_EACH_SIDE = 3
+PAGINATOR_ON_ENDS = 2
+# COUNT(*) ленты кэшируется до ближайшей записи Post/Follow;
+# ленты длиннее порога терпят устаревшее значение до истечения таймаута
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+# Посты авторов с числом подписчиков до порога раскладываются по лентам
+# при публикации; посты авторов выше порога подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 5000
+# До стольких подписчиков пост раскладывается в запросе публикации одним
+# INSERT ... SELECT; больше — в очередь воркера fan_out_posts
+TIMELINE_INLINE_FANOUT = 500
+TIMELINE_FANOUT_BATCH = 20
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 500
+# Карточки постов кэшируются по версии поста: устаревшие просто истекают
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# Страницы для гостей живут в кэше до записи, которая их затрагивает;
+# таймаут лишь страхует от пропущенной инвалидации
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_PARAMS = ('page', 'after', 'before')
+# Картинка в карточке: ширины для srcset, пропорция и форматы.
+# Все форматы, кроме последнего, идут в <source>, последний — в <img>
+CARD_WIDTHS = (480, 960, 1440)
+CARD_DEFAULT_WIDTH = 960
+CARD_HEIGHT_RATIO = 339 / 960
+CARD_FORMATS = ('WEBP', 'JPEG')
+CARD_SIZES = '(min-width: 768px) 75vw, 100vw'
+CARD_SIZE_NAME = 'card-{width}-{format}'
+# Размеры миниатюр картинок поста: имя -> (геометрия, опции sorl)
+THUMBNAIL_SIZES = {
+    CARD_SIZE_NAME.format(width=width, format=image_format.lower()): (
+        f'{width}x{round(width * CARD_HEIGHT_RATIO)}',
+        {'crop': 'center', 'upscale': True, 'format': image_format})
+    for width in CARD_WIDTHS for image_format in CARD_FORMATS
+}
+# Потоков и картинок за проход у generate_thumbnails
+THUMBNAIL_WORKERS = 4
+THUMBNAIL_BATCH = 50
+# Загрузка картинки: лимит файла, пикселей для JPEG (декодируется
+# в уменьшенном масштабе) и для остальных форматов (декодируются целиком);
+# оригинал больше POST_IMAGE_MAX_SIDE уменьшается при сохранении
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 100_000_000
+POST_IMAGE_MAX_DECODE_PIXELS = 25_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 90
+# Картинки постов лежат в posts/ab/cd/<sha256>: каталог на каждые
+# MEDIA_SHARD_WIDTH символов хеша, MEDIA_SHARD_LEVELS уровней
+MEDIA_SHARD_LEVELS = 2
+MEDIA_SHARD_WIDTH = 2
+MEDIA_SHARD_BATCH = 100
+# Сборка мусора в медиа: имён на запрос и возраст, моложе которого
+# файл не трогается (его пост ещё может сохраняться)
+MEDIA_GC_CHUNK = 500
+MEDIA_GC_MIN_AGE = 60 * 60
+# Отдача медиа: имена по хешу (картинки в шардах и миниатюры) не
+# меняются и кэшируются навсегда, остальные — на MEDIA_MAX_AGE
+MEDIA_MAX_AGE = 60 * 60 * 24
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_BLOCK_SIZE = 64 * 1024
+# Поиск: сколько слов запроса учитывается
+SEARCH_MAX_TERMS = 10
+# Импорт: строк на bulk_create и транзакцию, имён на запрос IN
+IMPORT_BATCH = 1000
+IMPORT_LOOKUP_CHUNK = 500
+# Выгрузка: строк на запрос
+EXPORT_CHUNK = 2000
@@ -0,0 +1,246 @@
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import search, thumbnails, timeline
+from .models import (Comment, Follow, Group, Post, StoredImage, User,
+                     UserStats)
+from .page_cache import invalidate_pages, invalidate_post_pages
+from .paginator import INDEX_SCOPE, invalidate_feed_counts
+from .storage import post_images
+
+
+def _bump(model, pk, **deltas):
+    """Атомарно сдвигает счётчики одной записи."""
+    if pk is not None:
+        model.objects.filter(pk=pk).update(
+            **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def _retain(name, content=None):
+    """Ещё один пост ссылается на файл картинки.
+
+    Ссылка берётся обновлением строки: delete_unused удаляет строку с нулём
+    и файл в одной транзакции, так что после _retain файл либо цел, либо
+    уже удалён, и тогда загрузка content записывает его заново.
+    """
+    if not name:
+        return
+    if not StoredImage.objects.filter(name=name).update(
+            refs=F('refs') + 1):
+        try:
+            with transaction.atomic():
+                StoredImage.objects.create(name=name, refs=1)
+        except IntegrityError:
+            _bump(StoredImage, name, refs=1)
+    if content is not None:
+        post_images.restore(name, content)
+
+
+def _release(name):
+    """Пост больше не ссылается на файл: последний удаляет его."""
+    if name:
+        StoredImage.objects.filter(name=name, refs__gt=0).update(
+            refs=F('refs') - 1)
+        # файл удаляется после коммита: откат оставит ссылку на месте
+        transaction.on_commit(lambda: thumbnails.delete_unused(name))
+
+
+def _invalidate_user_pages(*user_ids):
+    invalidate_pages(*(f'author:{username}' for username in
+                       User.objects.filter(pk__in=user_ids).values_list(
+                           'username', flat=True)))
+
+
+def _post_scopes(author_id, group_id):
+    """Области счётчиков лент, в которых стоит пост."""
+    return [f'author:{author_id}', group_id and f'group:{group_id}']
+
+
+@receiver(post_save, sender=Post)
+def post_feeds_changed(sender, instance, created, raw=False, **kwargs):
+    """Новый пост меняет длину своих лент, перенесённый — старых и новых.
+
+    Ленты подписок сбрасывает раскладка timeline.deliver.
+    """
+    if raw:
+        return
+    scopes = _post_scopes(instance.author_id, instance.group_id)
+    if created:
+        invalidate_feed_counts(INDEX_SCOPE, *scopes)
+        return
+    previous = getattr(instance, '_previous_place', None)
+    if previous and previous != (instance.author_id, instance.group_id):
+        invalidate_feed_counts(*scopes, *_post_scopes(*previous),
+                               *timeline.follower_scopes(previous[0]),
+                               *timeline.follower_scopes(instance.author_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_feeds_deleted(sender, instance, **kwargs):
+    invalidate_feed_counts(
+        INDEX_SCOPE, *_post_scopes(instance.author_id, instance.group_id),
+        *timeline.follower_scopes(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_feed_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_feed_counts(f'follow:{instance.user_id}')
+
+
+@receiver(pre_save, sender=Post)
+def post_image_changed(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние картинку, автора и группу поста.
+
+    Новый пост с картинкой встаёт в очередь миниатюр.
+    """
+    instance._previous_image = instance._previous_place = None
+    # загрузка нужна _retain, если файл с тем же хешем успели удалить
+    instance._uploaded_image = (
+        None if raw or instance.image._committed else instance.image.file)
+    if raw:
+        return
+    if instance._state.adding:
+        # пост без картинки в очередь generate_thumbnails не попадает
+        instance.thumbnails_ready = not instance.image
+        return
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'image', 'author_id', 'group_id').first()
+    if previous is not None:
+        instance._previous_image = previous[0]
+        instance._previous_place = previous[1:]
+    # пост мог уйти из прежней группы
+    invalidate_post_pages(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def post_changed(sender, instance, created, raw=False, **kwargs):
+    """Правка поста меняет версию, по которой кэшируется карточка.
+
+    Версия сдвигается в базе, как у комментариев и миниатюр: прочитанная
+    до правки могла устареть.
+    """
+    if created or raw:
+        return
+    changes = {'version': F('version') + 1}
+    if (instance._previous_image or None) != (instance.image.name or None):
+        # новая картинка встаёт в очередь generate_thumbnails
+        changes['thumbnails_ready'] = not instance.image
+    Post.objects.filter(pk=instance.pk).update(**changes)
+    instance.refresh_from_db(fields=list(changes))
+
+
+@receiver(post_save, sender=Post)
+def post_image_refs(sender, instance, raw=False, **kwargs):
+    """Ссылки на файлы картинок: новая прибавляется, прежняя отпускается."""
+    old = getattr(instance, '_previous_image', None)
+    if not raw and (old or None) != (instance.image.name or None):
+        _retain(instance.image.name,
+                getattr(instance, '_uploaded_image', None))
+        _release(old)
+
+
+@receiver(post_delete, sender=Post)
+def post_image_released(sender, instance, **kwargs):
+    _release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def post_pages_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_post_pages(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_pages_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_post_pages(instance.post_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_pages_deleted(sender, instance, **kwargs):
+    _invalidate_user_pages(instance.author_id)
+    if instance.group_id is not None:
+        invalidate_pages(*(f'group:{slug}' for slug in Group.objects.filter(
+            pk=instance.group_id).values_list('slug', flat=True)))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_pages_deleted(sender, instance, **kwargs):
+    invalidate_post_pages(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_user_pages(instance.author_id, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_pages_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_pages(f'author:{instance.username}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_pages(f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(UserStats, instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _bump(UserStats, instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(Post, instance.post_id, comment_count=1, version=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    _bump(Post, instance.post_id, comment_count=-1, version=1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(UserStats, instance.author_id, followers_count=1)
+        _bump(UserStats, instance.user_id, following_count=1)
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    _bump(UserStats, instance.author_id, followers_count=-1)
+    _bump(UserStats, instance.user_id, following_count=-1)
+    timeline.prune(instance)
+    timeline.follower_lost(instance.author_id)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    """Пересоздание posts_post в миграции теряет триггеры индекса поиска."""
+    if sender.name == 'posts':
+        search.ensure_index(connections[using])
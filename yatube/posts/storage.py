@@ -0,0 +1,75 @@
+"""Хранилище картинок постов по хешу содержимого.
+
+Файл называется sha256 своих байтов, поэтому одинаковые загрузки ложатся
+в один файл, а sorl режет для него один набор миниатюр. Сколько постов
+ссылается на файл, считает StoredImage: файл удаляется вместе с
+последней ссылкой.
+
+Файлы раскладываются по подкаталогам из первых символов хеша
+(posts/ab/cd/abcd....jpg), чтобы ни в одном каталоге не копились
+миллионы записей. Миниатюры sorl уже лежат так же: cache/ab/cd/.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .settings import MEDIA_SHARD_LEVELS, MEDIA_SHARD_WIDTH
+
+# хвост имени файла, уже лежащего в шардированном каталоге
+SHARDED_NAME = r'/({}/){{{}}}[0-9a-f]{{64}}(\.[a-z0-9]+)?$'.format(
+    '[0-9a-f]{%d}' % MEDIA_SHARD_WIDTH, MEDIA_SHARD_LEVELS)
+
+
+def content_hash(content):
+    """sha256 содержимого файла, прочитанного по кускам."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        # FileSystemStorage пишет и текст: он хранится в UTF-8
+        digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """Имя по хешу в шардах каталога upload_to, с расширением."""
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        shards = [digest[level * MEDIA_SHARD_WIDTH:
+                         (level + 1) * MEDIA_SHARD_WIDTH]
+                  for level in range(MEDIA_SHARD_LEVELS)]
+        return os.path.join(directory, *shards, digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # такой файл уже загружали: пост сошлётся на него же, а свежее
+            # время изменения убережёт файл от collect_media до коммита
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # последнюю ссылку удалили между проверкой и utime
+                content.seek(0)
+        return super().save(name, content, max_length)
+
+    def restore(self, name, content):
+        """Записывает content заново под его именем по хешу, если файла нет."""
+        if not self.exists(name):
+            content.seek(0)
+            super().save(name, content)
+
+
+def is_sharded(name):
+    """Лежит ли файл уже по своему хешу в шардированном каталоге."""
+    return re.search(SHARDED_NAME, name) is not None
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,54 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.settings import POST_CARD_TIMEOUT
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+
+def viewer_class(user, post):
+    """Чем карточка отличается для зрителя: гость, автор или читатель."""
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.pk == post.author_id:
+        return 'author'
+    return 'user'
+
+
+def card_key(post, viewer, hide_group):
+    """Ключ карточки: версия поста и всё, что выводится из связей."""
+    group = post.group
+    related = '|'.join([
+        post.author.username if post.author else '',
+        f'{group.slug}|{group.title}' if group else '',
+    ])
+    return 'post_card:{}:{}:{}:{}:{}'.format(
+        post.pk, post.version, viewer, int(bool(hide_group)),
+        hashlib.md5(related.encode()).hexdigest())
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, hide_group=False):
+    """Карточки постов страницы из кэша, недостающие — рендером."""
+    request = context['request']
+    keys = [(card_key(post, viewer_class(request.user, post), hide_group),
+             post) for post in posts]
+    cards = cache.get_many([key for key, _ in keys])
+    rendered = {}
+    prefetch_thumbnails([post for key, post in keys if key not in cards])
+    for key, post in keys:
+        if key not in cards:
+            rendered[key] = cards[key] = render_to_string('post_item.html', {
+                'post': post,
+                'hide_group': hide_group,
+                'request': request,
+                'user': request.user,
+            })
+    if rendered:
+        cache.set_many(rendered, POST_CARD_TIMEOUT)
+    return mark_safe(''.join(cards[key] for key, _ in keys))
@@ -0,0 +1,23 @@
+from django import template
+
+from posts.paginator import encode_cursor
+
+register = template.Library()
+
+
+@register.filter
+def next_cursor(page):
+    """Курсор на последний пост страницы для ссылки ?after=."""
+    return encode_cursor(page[len(page) - 1]) if len(page) else ''
+
+
+@register.filter
+def previous_cursor(page):
+    """Курсор на первый пост страницы для ссылки ?before=."""
+    return encode_cursor(page[0]) if len(page) else ''
+
+
+@register.filter
+def page_window(page):
+    """Номера страниц вокруг текущей вместо полного page_range."""
+    return page.paginator.get_elided_page_range(page.number)
@@ -0,0 +1,38 @@
+from django import template
+
+from posts.settings import (CARD_DEFAULT_WIDTH, CARD_FORMATS, CARD_SIZE_NAME,
+                            CARD_SIZES, CARD_WIDTHS)
+from posts.thumbnails import post_thumbnail
+
+register = template.Library()
+
+
+def _srcset(images):
+    return ', '.join(f'{image.url} {image.width}w' for image in images)
+
+
+@register.simple_tag
+def post_picture(post):
+    """Варианты картинки поста для <picture> или None, пока их нарезают.
+
+    Старые посты могут иметь не все варианты: в srcset идут готовые.
+    """
+    variants = {
+        image_format: [image for image in (
+            post_thumbnail(post, CARD_SIZE_NAME.format(
+                width=width, format=image_format.lower()))
+            for width in CARD_WIDTHS) if image]
+        for image_format in CARD_FORMATS}
+    *preferred, fallback = CARD_FORMATS
+    images = variants[fallback]
+    if not images:
+        return None
+    return {
+        'sources': [{'type': f'image/{image_format.lower()}',
+                     'srcset': _srcset(variants[image_format])}
+                    for image_format in preferred if variants[image_format]],
+        'img': min(images,
+                   key=lambda image: abs(image.width - CARD_DEFAULT_WIDTH)),
+        'srcset': _srcset(images),
+        'sizes': CARD_SIZES,
+    }
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.forms import PostForm
+from posts.models import Comment, Post, User
+
+TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
+TEST_TEXT = 'test-text'
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+RENDER = 'posts.templatetags.post_cards.render_to_string'
+
+
+class PostCardCacheTest(TestCase):
+    """Кэш отрендеренных карточек постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.user_2 = User.objects.create_user(TEST_USERNAME_2)
+        cls.post = Post.objects.create(text=TEST_TEXT, author=cls.user)
+        cls.POST_EDIT_URL = reverse('post_edit', kwargs={
+            'username': cls.user.username, 'post_id': cls.post.id})
+        cls.guest_client = Client()
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.authorized_client_2 = Client()
+        cls.authorized_client_2.force_login(cls.user_2)
+
+    def setUp(self):
+        cache.clear()
+
+    def renders(self, client):
+        with mock.patch(RENDER, wraps=render_to_string) as render:
+            response = client.get(PROFILE_URL)
+        return response, render.call_count
+
+    def test_card_rendered_once(self):
+        self.assertEqual(self.renders(self.guest_client)[1], 1)
+        self.assertEqual(self.renders(self.guest_client)[1], 0)
+
+    def test_viewer_classes(self):
+        response, _ = self.renders(self.authorized_client)
+        self.assertContains(response, self.POST_EDIT_URL)
+        response, rendered = self.renders(self.authorized_client_2)
+        self.assertEqual(rendered, 1)
+        self.assertNotContains(response, self.POST_EDIT_URL)
+
+    def test_comment_bumps_version(self):
+        self.renders(self.guest_client)
+        Comment.objects.create(post=self.post, author=self.user_2,
+                               text=TEST_TEXT)
+        response, rendered = self.renders(self.guest_client)
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_edit_bumps_version(self):
+        self.renders(self.authorized_client)
+        self.authorized_client.post(self.POST_EDIT_URL, {'text': 'новый'})
+        response, rendered = self.renders(self.authorized_client)
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'новый')
+
+    def test_edit_after_comment_keeps_counters(self):
+        """Комментарий между чтением и сохранением правки не теряется"""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.user_2,
+                               text=TEST_TEXT)
+        commented = Post.objects.get(pk=self.post.pk)
+        stale.text = 'новый'
+        stale.save(update_fields=PostForm.Meta.fields)
+        self.assertEqual(stale.version, commented.version + 1)
+        edited = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(edited.version, commented.version + 1)
+        self.assertEqual(edited.comment_count, 1)
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import _get_new_csrf_token
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
+TEST_TEXT = 'test-text'
+NEW_TEXT = 'new-text'
+TEST_SLUG = 'test-slug'
+HOMEPAGE_URL = reverse('index')
+GROUP_URL = reverse('group_posts', kwargs={'slug': TEST_SLUG})
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+
+
+class ConditionalGetTest(TestCase):
+    """ETag лент и страницы поста: 304 без сборки страницы"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.user_2 = User.objects.create_user(TEST_USERNAME_2)
+        cls.group = Group.objects.create(title=TEST_SLUG, slug=TEST_SLUG)
+        cls.post = Post.objects.create(text=TEST_TEXT, author=cls.user,
+                                       group=cls.group)
+        cls.POST_URL = reverse('post', kwargs={
+            'username': cls.user.username, 'post_id': cls.post.id})
+        cls.URLS = [HOMEPAGE_URL, GROUP_URL, PROFILE_URL, cls.POST_URL]
+        cls.guest_client = Client()
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user_2)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        cache.clear()
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        for client in [self.guest_client, self.authorized_client]:
+            for url in self.URLS:
+                with self.subTest(url=url, client=client):
+                    response = self.revalidate(client, url)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertIsNone(response.context)
+
+    def test_changes_reset_etag(self):
+        changes = [
+            lambda: Post.objects.create(text=NEW_TEXT, author=self.user,
+                                        group=self.group),
+            lambda: Comment.objects.create(post=self.post, author=self.user,
+                                           text=NEW_TEXT),
+        ]
+        for change in changes:
+            etags = {url: self.guest_client.get(url)['ETag']
+                     for url in self.URLS}
+            change()
+            cache.clear()
+            for url, etag in etags.items():
+                with self.subTest(url=url):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_follow_resets_author_pages(self):
+        etags = {url: self.authorized_client.get(url)['ETag']
+                 for url in [PROFILE_URL, self.POST_URL]}
+        Follow.objects.create(user=self.user_2, author=self.user)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_by_viewer(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.guest_client.get(url)['ETag'],
+                    self.authorized_client.get(url)['ETag'])
+
+    def test_new_csrf_secret_resets_etag(self):
+        """После перелогина форма комментария нужна с новым токеном"""
+        client = Client()
+        client.force_login(self.user_2)
+        client.get(self.POST_URL)
+        etag = client.get(self.POST_URL)['ETag']
+        self.assertEqual(client.get(
+            self.POST_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # вход меняет секрет CSRF в куке
+        client.cookies[settings.CSRF_COOKIE_NAME] = _get_new_csrf_token()
+        response = client.get(self.POST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_cached_page_not_modified(self):
+        """Ответ из кэша гостевых страниц тоже сверяется с ETag"""
+        etag = self.guest_client.get(PROFILE_URL)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                PROFILE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_page(self):
+        response = self.guest_client.get(
+            reverse('group_posts', kwargs={'slug': 'missing'}),
+            HTTP_IF_NONE_MATCH='"missing"')
+        self.assertEqual(response.status_code, 404)
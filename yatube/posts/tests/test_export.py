@@ -0,0 +1,118 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.exporter import Export, format_watermark, parse_watermark
+from posts.models import Comment, Group, Post, User
+
+POSTS = 5
+EXPORT_URL = reverse('export', args=['posts'])
+
+
+def lines(export):
+    return [json.loads(line) for line in
+            b''.join(export).decode().splitlines()]
+
+
+class ExportTest(TestCase):
+    """Выгрузка пачками по курсору и продолжение с водяного знака"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('leo')
+        cls.staff = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        group = Group.objects.create(title='Коты', slug='cats')
+        for number in range(POSTS):
+            Post.objects.create(text=f'пост {number}', author=cls.user,
+                                group=group if number % 2 else None)
+        # одинаковая дата: порядок и курсор держатся на id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cls.posts = list(Post.objects.order_by('id'))
+        Comment.objects.create(post=cls.posts[0], author=cls.user,
+                               text='комментарий')
+
+    def test_posts_in_chunks(self):
+        export = Export('posts', chunk=2)
+        with CaptureQueriesContext(connection) as queries:
+            rows = lines(export)
+        self.assertEqual([row['id'] for row in rows],
+                         [post.id for post in self.posts])
+        self.assertEqual(rows[1]['group'], 'cats')
+        self.assertEqual(rows[1]['author'], 'leo')
+        self.assertIsNone(rows[0]['group'])
+        # три пачки и пустой запрос в конце, без OFFSET
+        self.assertEqual(len(queries), 4)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+        self.assertEqual(export.rows, POSTS)
+
+    def test_resume_from_watermark(self):
+        first = Export('posts', chunk=2)
+        iterator = iter(first)
+        next(iterator)
+        watermark = parse_watermark(format_watermark(first.watermark))
+        rows = lines(Export('posts', after=watermark))
+        self.assertEqual([row['id'] for row in rows],
+                         [post.id for post in self.posts[2:]])
+
+    def test_csv_and_gzip(self):
+        plain = b''.join(Export('comments', 'csv'))
+        self.assertEqual(
+            gzip.decompress(b''.join(Export('comments', 'csv',
+                                            compress=True))), plain)
+        rows = list(csv.DictReader(io.StringIO(plain.decode())))
+        self.assertEqual(rows[0]['post'], str(self.posts[0].id))
+        self.assertEqual(rows[0]['text'], 'комментарий')
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'posts.ndjson.gz')
+        err = StringIO()
+        call_command('export_data', 'posts', '--gzip', '-o', path,
+                     stderr=err)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), POSTS)
+        shutil.rmtree(directory)
+        watermark = err.getvalue().split('водяной знак: ')[1].strip()
+        self.assertEqual(parse_watermark(watermark)[1], self.posts[-1].id)
+
+    def test_endpoint(self):
+        self.assertEqual(Client().get(EXPORT_URL).status_code, 302)
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(EXPORT_URL, {'gzip': 1})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(content.splitlines()), POSTS)
+        self.assertEqual(
+            client.get(EXPORT_URL, {'after': 'вчера,1'}).status_code, 400)
+        self.assertEqual(
+            client.get(EXPORT_URL, {'format': 'xml'}).status_code, 404)
+
+    def test_watermark_pasted_into_url(self):
+        """Водяной знак export_data работает в ?after= без экранирования"""
+        client = Client()
+        client.force_login(self.staff)
+        date = self.posts[0].pub_date
+        watermarks = [format_watermark((date, self.posts[1].id)),
+                      f'{date.isoformat()},{self.posts[1].id}']
+        self.assertNotIn('+', watermarks[0])
+        for watermark in watermarks:
+            with self.subTest(watermark=watermark):
+                response = client.get(f'{EXPORT_URL}?after={watermark}')
+                self.assertEqual(response.status_code, 200)
+                rows = lines(response.streaming_content)
+                self.assertEqual([row['id'] for row in rows],
+                                 [post.id for post in self.posts[2:]])
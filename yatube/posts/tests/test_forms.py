@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -31,6 +32,9 @@ UPLOADED = SimpleUploadedFile(
     name='small.gif', content=PICTURE, content_type='image/gif')
 IMAGE = 'small___.gif'
 IMAGE_EDIT = 'small_edited.gif'
+# файл в хранилище называется по хешу содержимого и лежит в шардах
+DIGEST = hashlib.sha256(PICTURE).hexdigest()
+STORED_IMAGE = f'posts/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.gif'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -107,7 +111,7 @@ class PostCreateForm(TestCase):
         self.assertEqual(new_post.text, form_data['text'])
         self.assertEqual(new_post.author, self.user)
         self.assertEqual(new_post.group.id, form_data['group'])
-        self.assertEqual(new_post.image.name, f'posts/{IMAGE}')
+        self.assertEqual(new_post.image.name, STORED_IMAGE)
 
     def test_new_post(self):
         """Шаблон редактирования/создания поста с нужным context"""
@@ -148,7 +152,7 @@ class PostCreateForm(TestCase):
         self.assertEqual(post_to_edit.text, form_data['text'])
         self.assertEqual(post_to_edit.group.id, form_data['group'])
         self.assertEqual(post_to_edit.author, self.post.author)
-        self.assertEqual(post_to_edit.image, f'posts/{IMAGE_EDIT}')
+        self.assertEqual(post_to_edit.image, STORED_IMAGE)
 
     def test_create_new_comment(self):
         """Комментарий"""
@@ -0,0 +1,159 @@
+import os
+import resource
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from PIL import Image, PngImagePlugin
+
+from posts.forms import PostForm
+from posts.images import EXIF_ORIENTATION, sanitize
+
+TEST_TEXT = 'test-text'
+CAMERA = 'secret-camera'
+EXIF_MAKE = 0x010F
+COLOR = (200, 10, 10)
+# оригинал 8000x6000 в оттенках серого: 48 МБ при полном декодировании
+HUGE_SIZE = (8000, 6000)
+MEMORY_SIDE = 1000
+MEMORY_LIMIT = 16 * 2 ** 20
+
+
+def jpeg(size=(20, 10), orientation=None, mode='RGB'):
+    exif = Image.Exif()
+    exif[EXIF_MAKE] = CAMERA
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    data = BytesIO()
+    Image.new(mode, size, COLOR[0] if mode == 'L' else COLOR).save(
+        data, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('image.jpg', data.getvalue(),
+                              content_type='image/jpeg')
+
+
+def mpo(size=(20, 10)):
+    """JPEG с телефона: второй кадр и индекс MPF."""
+    exif = Image.Exif()
+    exif[EXIF_MAKE] = CAMERA
+    data = BytesIO()
+    Image.new('RGB', size, COLOR).save(
+        data, 'MPO', save_all=True, exif=exif.tobytes(),
+        append_images=[Image.new('RGB', size, COLOR[::-1])])
+    return SimpleUploadedFile('image.jpg', data.getvalue(),
+                              content_type='image/jpeg')
+
+
+def png(size=(20, 10)):
+    info = PngImagePlugin.PngInfo()
+    info.add_text('Author', CAMERA)
+    data = BytesIO()
+    Image.new('RGB', size, COLOR).save(data, 'PNG', pnginfo=info)
+    return SimpleUploadedFile('image.png', data.getvalue(),
+                              content_type='image/png')
+
+
+def rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def peak_memory(function):
+    """Прирост пикового RSS дочернего процесса, выполнившего function."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            before = rss()
+            function()
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            os.write(write, str(peak - before).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    return int(os.read(read, 64) or -1)
+
+
+class SanitizeTest(SimpleTestCase):
+    """Проверка загрузки по заголовку и очистка метаданных"""
+
+    def clean(self, upload):
+        result = sanitize(upload)
+        result.seek(0)
+        return result.read()
+
+    def test_jpeg_exif_stripped(self):
+        data = self.clean(jpeg())
+        self.assertNotIn(CAMERA.encode(), data)
+        image = Image.open(BytesIO(data))
+        self.assertEqual(image.size, (20, 10))
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_mpo_accepted_as_jpeg(self):
+        upload = mpo()
+        self.assertEqual(Image.open(upload).format, 'MPO')
+        data = self.clean(upload)
+        self.assertNotIn(CAMERA.encode(), data)
+        # второй кадр и MPF отрезаны: остаётся обычный JPEG
+        self.assertEqual(data.count(b'\xff\xd8'), 1)
+        self.assertNotIn(b'MPF\x00', data)
+        image = Image.open(BytesIO(data))
+        self.assertEqual(image.format, 'JPEG')
+        image.load()
+        with mock.patch('posts.images.POST_IMAGE_MAX_SIDE', 10):
+            image = Image.open(BytesIO(self.clean(mpo())))
+        self.assertEqual((image.format, image.size), ('JPEG', (10, 5)))
+
+    def test_orientation_applied(self):
+        data = self.clean(jpeg(orientation=6))
+        image = Image.open(BytesIO(data))
+        self.assertEqual(image.size, (10, 20))
+        self.assertNotIn(CAMERA.encode(), data)
+
+    def test_png_text_stripped(self):
+        data = self.clean(png())
+        self.assertNotIn(CAMERA.encode(), data)
+        Image.open(BytesIO(data)).load()
+
+    def test_large_original_downsampled(self):
+        with mock.patch('posts.images.POST_IMAGE_MAX_SIDE', 100):
+            for upload in [jpeg((400, 300)), png((400, 300))]:
+                with self.subTest(name=upload.name):
+                    image = Image.open(BytesIO(self.clean(upload)))
+                    self.assertEqual(image.size, (100, 75))
+
+    def test_limits(self):
+        cases = [
+            ['posts.images.POST_IMAGE_MAX_BYTES', 10, jpeg()],
+            ['posts.images.POST_IMAGE_MAX_PIXELS', 100, jpeg()],
+            ['posts.images.POST_IMAGE_MAX_DECODE_PIXELS', 100, png()],
+        ]
+        for setting, value, upload in cases:
+            with self.subTest(setting=setting), \
+                    mock.patch(setting, value):
+                form = PostForm(data={'text': TEST_TEXT},
+                                files={'image': upload})
+                self.assertFalse(form.is_valid())
+                self.assertIn('image', form.errors)
+
+    def test_form_cleans_upload(self):
+        form = PostForm(data={'text': TEST_TEXT}, files={'image': jpeg()})
+        self.assertTrue(form.is_valid())
+        image = form.cleaned_data['image']
+        self.assertNotIn(CAMERA.encode(), image.read())
+
+    def test_form_opens_upload_once(self):
+        """Поле не проверяет картинку целиком до sanitize"""
+        with mock.patch.object(Image, 'open', wraps=Image.open) as image_open:
+            form = PostForm(data={'text': TEST_TEXT},
+                            files={'image': jpeg()})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(image_open.call_count, 1)
+
+    def test_huge_jpeg_memory_bounded(self):
+        """Огромный JPEG уменьшается без полного декодирования"""
+        upload = jpeg(HUGE_SIZE, mode='L')
+        with mock.patch('posts.images.POST_IMAGE_MAX_SIDE', MEMORY_SIDE):
+            self.assertLess(peak_memory(lambda: sanitize(upload)),
+                            MEMORY_LIMIT)
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.search import has_fts, search_posts
+from posts.timeline import follow_feed
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PUB_DATE = '2015-03-01T10:00:00+00:00'
+
+
+def write(name, content):
+    path = os.path.join(TEMP_DIR, name)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    return path
+
+
+def ndjson(*records):
+    return '\n'.join(record if isinstance(record, str)
+                     else json.dumps(record, ensure_ascii=False)
+                     for record in records) + '\n'
+
+
+class BulkImportTest(TestCase):
+    """Загрузка в обход сигналов оставляет счётчики и ленты верными"""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def load(self, kind, name, content, *args):
+        out = StringIO()
+        call_command('bulk_import', kind, write(name, content), *args,
+                     stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_posts(self):
+        output = self.load('posts', 'posts.ndjson', ndjson(
+            {'id': 100, 'text': 'первый пост', 'author': 'leo',
+             'group': 'cats', 'pub_date': PUB_DATE},
+            {'text': 'второй пост', 'author': 'leo'},
+            '{битый json',
+            {'text': '', 'author': 'leo'},
+            {'text': 'дата', 'author': 'leo', 'pub_date': 'вчера'},
+            [1, 2],
+        ), '--batch', '2')
+        self.assertIn('Прочитано 6, записано 2, пропущено 4', output)
+        author = User.objects.get(username='leo')
+        post = Post.objects.get(id=100)
+        self.assertEqual(post.pub_date.isoformat(), PUB_DATE)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(author.stats.posts_count, 2)
+        self.assertFalse(author.has_usable_password())
+        # новые посты после загрузки получают id дальше загруженных
+        self.assertGreater(
+            Post.objects.create(text='после', author=author).id, 100)
+        if has_fts():
+            self.assertEqual(list(search_posts('первый')), [post])
+
+    def test_comments_csv(self):
+        author = User.objects.create_user('leo')
+        post = Post.objects.create(text='пост', author=author)
+        version = post.version
+        output = self.load(
+            'comments', 'comments.csv',
+            'post,text,author,created\n'
+            f'{post.id},первый,ann,{PUB_DATE}\n'
+            f'{post.id},второй,bob,\n'
+            f'{post.id + 1},к чужому,ann,\n'
+            f'{post.id},,ann,\n')
+        self.assertIn('записано 2, пропущено 2', output)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        self.assertGreater(post.version, version)
+        self.assertEqual(
+            Comment.objects.get(text='первый').created.isoformat(), PUB_DATE)
+
+    def test_follows(self):
+        author = User.objects.create_user('leo')
+        post = Post.objects.create(text='пост', author=author)
+        self.load('follows', 'follows.ndjson', ndjson(
+            {'user': 'ann', 'author': 'leo'},
+            {'user': 'ann', 'author': 'leo'},
+            {'user': 'bob', 'author': 'leo'},
+            {'user': 'bob', 'author': 'bob'},
+        ), '--batch', '1')
+        self.assertEqual(Follow.objects.filter(author=author).count(), 2)
+        author.stats.refresh_from_db()
+        self.assertEqual(author.stats.followers_count, 2)
+        reader = User.objects.get(username='ann')
+        self.assertEqual(list(follow_feed(reader)), [post])
+
+    def test_finish_touches_only_imported(self):
+        """Пересчёт в конце не обходит всю базу"""
+        other = User.objects.create_user('ann')
+        UserStats.objects.filter(user=other).update(posts_count=5)
+        pub_date = Post._meta.get_field('pub_date')
+        self.load('posts', 'posts.ndjson', ndjson(
+            {'text': 'пост', 'author': 'leo', 'pub_date': PUB_DATE}))
+        self.assertTrue(pub_date.auto_now_add)
+        self.assertEqual(User.objects.get(username='leo').stats.posts_count,
+                         1)
+        other.stats.refresh_from_db()
+        self.assertEqual(other.stats.posts_count, 5)
+
+    def test_failed_batch(self):
+        """Ошибка пачки не откатывает прежние, а счётчики пересчитываются"""
+        with self.assertRaisesMessage(CommandError, 'строки 2'):
+            self.load('posts', 'duplicate.ndjson', ndjson(
+                {'id': 7, 'text': 'пост', 'author': 'leo'},
+                {'id': 7, 'text': 'повтор', 'author': 'leo'},
+            ), '--batch', '1')
+        author = User.objects.get(username='leo')
+        self.assertEqual(author.stats.posts_count, 1)
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.storage import post_images
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+SIZE = len(CONTENT)
+LEGACY_IMAGE = 'posts/legacy.bin'
+IMMUTABLE = 'immutable'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaViewTest(TestCase):
+    """Отдача медиа: Range, валидаторы кэша и sendfile"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        with override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT):
+            cls.name = post_images.save('posts/file.bin',
+                                        ContentFile(CONTENT))
+            # до шардирования файлы лежали в posts/ под своими именами
+            post_images._save(LEGACY_IMAGE, ContentFile(CONTENT))
+        cls.url = reverse('media', args=[cls.name])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, CONTENT)
+        self.assertEqual(response['Content-Length'], str(SIZE))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn(IMMUTABLE, response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_sharded_etag_is_content_hash(self):
+        """Повторная загрузка того же файла не меняет валидаторы"""
+        etag = self.get()['ETag']
+        self.assertEqual(etag, '"{}"'.format(
+            os.path.splitext(os.path.basename(self.name))[0]))
+        self.assertNotIn('Last-Modified', self.get())
+        post_images.save('posts/again.bin', ContentFile(CONTENT))
+        self.assertEqual(self.get()['ETag'], etag)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_file_deleted_after_stat(self):
+        with mock.patch('posts.media.open', side_effect=FileNotFoundError,
+                        create=True):
+            self.assertEqual(self.get().status_code, 404)
+
+    def test_legacy_name_not_immutable(self):
+        response = self.get(reverse('media', args=[LEGACY_IMAGE]))
+        self.assertEqual(response.body, CONTENT)
+        self.assertNotIn(IMMUTABLE, response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+    def test_ranges(self):
+        cases = [
+            ('bytes=0-99', 0, 99),
+            ('bytes=1000-', 1000, SIZE - 1),
+            ('bytes=-24', SIZE - 24, SIZE - 1),
+            ('bytes=1000-5000', 1000, SIZE - 1),
+        ]
+        for header, start, end in cases:
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.body, CONTENT[start:end + 1])
+                self.assertEqual(response['Content-Length'],
+                                 str(end - start + 1))
+                self.assertEqual(response['Content-Range'],
+                                 f'bytes {start}-{end}/{SIZE}')
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE=f'bytes={SIZE}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{SIZE}')
+
+    def test_full_file_instead_of_range(self):
+        etag = self.get()['ETag']
+        cases = {
+            'несколько диапазонов': {'HTTP_RANGE': 'bytes=0-1,5-6'},
+            'не байты': {'HTTP_RANGE': 'items=0-1'},
+            'устаревший If-Range': {'HTTP_RANGE': 'bytes=0-1',
+                                    'HTTP_IF_RANGE': '"old"'},
+        }
+        for case, headers in cases.items():
+            with self.subTest(case=case):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.body, CONTENT)
+        response = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn(IMMUTABLE, response['Cache-Control'])
+
+    def test_forbidden_paths(self):
+        paths = [
+            'posts/../../yatube/settings.py',
+            'posts/./file.bin',
+            'posts/.hidden',
+            'posts/missing.bin',
+            'posts',
+            'other/file.bin',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(
+                    self.get(settings.MEDIA_URL + path).status_code, 404)
+
+    def test_post_not_allowed(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        response = self.get()
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + self.name)
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_sendfile(self):
+        response = self.get()
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Sendfile'], post_images.path(self.name))
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.dbm_kvstore import KVStore as DBMStore
+
+from posts.models import Post, StoredImage, User
+from posts.settings import THUMBNAIL_SIZES
+from posts.storage import post_images
+from posts.thumbnails import thumbnail
+
+TEST_USERNAME = 'mike'
+TEST_TEXT = 'test-text'
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PICTURE = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+           b'\x01\x00\x80\x00\x00\x00\x00\x00'
+           b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+           b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+           b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+           b'\x0A\x00\x3B')
+OTHER_PICTURE = PICTURE.replace(b'\xFF\xFF\xFF', b'\xFF\x00\x00')
+STRAY_THUMBNAIL = 'cache/00/00/stray.jpg'
+CARD = 'card-960-jpeg'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTest(TestCase):
+    """collect_media убирает файлы и записи kvstore без живых постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text=TEST_TEXT, author=self.user, image=SimpleUploadedFile(
+                'live.gif', PICTURE, content_type='image/gif'))
+        self.live_thumbnail = thumbnail(self.post.image, CARD)
+        # картинка поста, удалённого в обход сигналов
+        self.orphan = post_images.save('posts/orphan.gif',
+                                       ContentFile(OTHER_PICTURE))
+        self.orphan_thumbnail = thumbnail(self.orphan, CARD)
+        default.storage.save(STRAY_THUMBNAIL, ContentFile(b'stray'))
+        # миниатюра из времён прежнего хранилища
+        geometry, options = THUMBNAIL_SIZES[CARD]
+        self.stale_thumbnail = get_thumbnail(
+            ImageFile(self.post.image.name, default.storage),
+            geometry, **options)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_reports(self):
+        out = self.collect('--dry-run', '--min-age=0')
+        for name in (self.orphan, STRAY_THUMBNAIL):
+            with self.subTest(name=name):
+                self.assertIn(name, out)
+                self.assertTrue(default.storage.exists(name))
+        self.assertTrue(self.stale_thumbnail.exists())
+
+    def test_orphans_deleted(self):
+        self.collect('--min-age=0')
+        for image in (self.post.image, self.live_thumbnail):
+            with self.subTest(name=image.name):
+                self.assertTrue(image.storage.exists(image.name))
+        for image in (ImageFile(self.orphan, post_images),
+                      self.orphan_thumbnail, self.stale_thumbnail,
+                      ImageFile(STRAY_THUMBNAIL)):
+            with self.subTest(name=image.name):
+                self.assertFalse(image.storage.exists(image.name))
+                self.assertIsNone(default.kvstore.get(image))
+        self.assertEqual(list(StoredImage.objects.values_list('name',
+                                                              flat=True)),
+                         [self.post.image.name])
+
+    def test_fresh_files_kept(self):
+        self.collect()
+        self.assertTrue(post_images.exists(self.orphan))
+        self.assertTrue(default.storage.exists(STRAY_THUMBNAIL))
+
+    def test_non_db_kvstore_keeps_thumbnails(self):
+        """Без kvstore в базе миниатюры не считаются сиротами"""
+        kvstore = DBMStore()
+        kvstore.filename = os.path.join(TEMP_MEDIA_ROOT, 'kvstore')
+        with mock.patch.object(default, 'kvstore', kvstore):
+            out = self.collect('--min-age=0')
+        self.assertIn('не проверяются', out)
+        for image in (self.live_thumbnail, self.stale_thumbnail,
+                      ImageFile(STRAY_THUMBNAIL)):
+            with self.subTest(name=image.name):
+                self.assertTrue(image.storage.exists(image.name))
+        self.assertFalse(post_images.exists(self.orphan))
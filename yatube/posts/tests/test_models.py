@@ -1,9 +1,13 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserStats
 
 
 TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
 
 
 class PostModelTest(TestCase):
@@ -40,3 +44,48 @@ class GroupModelTest(TestCase):
         self.assertEqual(expected_title, str(group),
                          'Метод создния группы не корректен'
                          )
+
+
+class CountersTest(TestCase):
+    """Денормализованные счётчики"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.user_2 = User.objects.create_user(TEST_USERNAME_2)
+
+    def assertStats(self, user, posts, followers, following):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following))
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text='пост', author=self.user)
+        comment = Comment.objects.create(
+            post=post, author=self.user_2, text='коммент')
+        follow = Follow.objects.create(user=self.user_2, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertStats(self.user, 1, 1, 0)
+        self.assertStats(self.user_2, 0, 0, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertStats(self.user_2, 0, 0, 0)
+        post.delete()
+        self.assertStats(self.user, 0, 0, 0)
+
+    def test_recount_command(self):
+        post = Post.objects.create(text='пост', author=self.user)
+        Comment.objects.create(post=post, author=self.user, text='коммент')
+        Follow.objects.create(user=self.user, author=self.user_2)
+        Post.objects.update(comment_count=0)
+        UserStats.objects.update(posts_count=0, following_count=5)
+        UserStats.objects.filter(user=self.user_2).delete()
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertStats(self.user, 1, 0, 1)
+        self.assertStats(self.user_2, 0, 1, 0)
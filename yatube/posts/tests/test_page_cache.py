@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
+TEST_TEXT = 'test-text'
+NEW_TEXT = 'new-text'
+TEST_SLUG = 'test-slug'
+TEST_SLUG_2 = 'test-slug_2'
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+GROUP_URL = reverse('group_posts', kwargs={'slug': TEST_SLUG})
+GROUP_URL_2 = reverse('group_posts', kwargs={'slug': TEST_SLUG_2})
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Кэш гостевых страниц группы, профиля и поста"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.user_2 = User.objects.create_user(TEST_USERNAME_2)
+        cls.group = Group.objects.create(title=TEST_SLUG, slug=TEST_SLUG)
+        cls.group_2 = Group.objects.create(title=TEST_SLUG_2,
+                                           slug=TEST_SLUG_2)
+        cls.post = Post.objects.create(text=TEST_TEXT, author=cls.user,
+                                       group=cls.group)
+        cls.POST_URL = reverse('post', kwargs={
+            'username': cls.user.username, 'post_id': cls.post.id})
+        cls.guest_client = Client()
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_for_guests(self):
+        for url in [PROFILE_URL, GROUP_URL, self.POST_URL]:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+
+    def test_authorized_bypass_cache(self):
+        self.authorized_client.get(PROFILE_URL)
+        response = self.authorized_client.get(PROFILE_URL)
+        self.assertIsNotNone(response.context)
+
+    def test_varies_on_page(self):
+        self.guest_client.get(PROFILE_URL)
+        response = self.guest_client.get(PROFILE_URL, {'page': 2})
+        self.assertIsNotNone(response.context)
+
+    def test_writes_invalidate_pages(self):
+        writes = [
+            [PROFILE_URL, lambda: Post.objects.create(
+                text=NEW_TEXT, author=self.user)],
+            [self.POST_URL, lambda: Comment.objects.create(
+                text=NEW_TEXT, author=self.user_2, post=self.post)],
+            [PROFILE_URL, lambda: Follow.objects.create(
+                user=self.user_2, author=self.user)],
+            [GROUP_URL_2, lambda: Post.objects.create(
+                text=NEW_TEXT, author=self.user_2, group=self.group_2)],
+        ]
+        for url, write in writes:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                write()
+                response = self.guest_client.get(url)
+                self.assertIsNotNone(response.context)
+
+    def test_moved_post_leaves_old_group(self):
+        self.guest_client.get(GROUP_URL)
+        self.post.group = self.group_2
+        self.post.save()
+        response = self.guest_client.get(GROUP_URL)
+        self.assertNotIn(self.post, response.context['page'])
@@ -0,0 +1,181 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post, User
+from posts.paginator import FeedPaginator, decode_cursor, encode_cursor
+from posts.settings import PAGINATOR_COUNT
+from posts.templatetags.post_filters import next_cursor, previous_cursor
+from posts.timeline import follow_feed, follow_scopes, merged_authors
+
+TEST_USERNAME = 'mike'
+TEST_TEXT = 'test-text'
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+PAGES = 3
+
+
+class CursorPaginatorTest(TestCase):
+    """Keyset-пагинация по ?after= и ?before="""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        for number in range(PAGINATOR_COUNT * PAGES - 1):
+            Post.objects.create(text=f'{TEST_TEXT}-{number}', author=cls.user)
+        # одинаковое время публикации: порядок держится на id
+        pub_date = Post.objects.first().pub_date
+        Post.objects.update(pub_date=pub_date)
+        cls.posts = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(decode_cursor(encode_cursor(post)),
+                         (post.pub_date, post.id))
+        for token in ['', 'мусор', '!!!', encode_cursor(post)[:-3]]:
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+
+    def test_pages_by_cursor(self):
+        """Переход по курсорам повторяет порядок ленты"""
+        page = self.guest_client.get(PROFILE_URL).context['page']
+        seen = list(page)
+        while page.has_next():
+            last = page[len(page) - 1]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.guest_client.get(
+                    PROFILE_URL, {'after': encode_cursor(last)})
+            self.assertFalse(any(
+                'OFFSET' in query['sql'] for query in queries))
+            page = response.context['page']
+            self.assertTrue(page.has_previous())
+            seen.extend(page)
+        self.assertEqual(seen, self.posts)
+
+    def test_previous_page_by_cursor(self):
+        first = self.posts[PAGINATOR_COUNT]
+        response = self.guest_client.get(
+            PROFILE_URL, {'before': encode_cursor(first)})
+        page = response.context['page']
+        self.assertEqual(list(page), self.posts[:PAGINATOR_COUNT])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_broken_cursor_opens_first_page(self):
+        response = self.guest_client.get(PROFILE_URL, {'after': 'мусор'})
+        self.assertEqual(list(response.context['page']),
+                         self.posts[:PAGINATOR_COUNT])
+
+    def test_cursor_past_feed_edge_opens_first_page(self):
+        """Курсор за краем ленты или на удалённых соседях — не 500"""
+        first_page = self.posts[:PAGINATOR_COUNT]
+        for params in [{'before': encode_cursor(self.posts[0])},
+                       {'after': encode_cursor(self.posts[-1])}]:
+            with self.subTest(params=params):
+                response = self.guest_client.get(PROFILE_URL, params)
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page']
+                self.assertEqual(list(page), first_page)
+                self.assertFalse(page.has_previous())
+                self.assertTrue(page.has_next())
+
+    def test_empty_feed_cursor_page(self):
+        Post.objects.all().delete()
+        response = self.guest_client.get(
+            PROFILE_URL, {'before': encode_cursor(self.posts[0])})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page']
+        self.assertEqual(len(page), 0)
+        self.assertEqual(next_cursor(page), '')
+        self.assertEqual(previous_cursor(page), '')
+
+
+class FeedPaginatorTest(TestCase):
+    """Кэш COUNT и окно номеров страниц"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        for number in range(PAGINATOR_COUNT + 1):
+            Post.objects.create(text=f'{TEST_TEXT}-{number}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self):
+        return FeedPaginator(Post.objects.all(), PAGINATOR_COUNT).count
+
+    def test_count_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(), PAGINATOR_COUNT + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), PAGINATOR_COUNT + 1)
+
+    def test_new_post_resets_count(self):
+        self.count()
+        Post.objects.create(text=TEST_TEXT, author=self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(), PAGINATOR_COUNT + 2)
+
+    def test_other_feeds_keep_count(self):
+        """Пост сбрасывает счётчики только своих лент"""
+        other = User.objects.create_user('other')
+
+        def count(author):
+            return FeedPaginator(Post.objects.filter(author=author),
+                                 PAGINATOR_COUNT,
+                                 scopes=[f'author:{author.pk}']).count
+
+        count(self.user)
+        count(other)
+        Post.objects.create(text=TEST_TEXT, author=other)
+        with self.assertNumQueries(0):
+            self.assertEqual(count(self.user), PAGINATOR_COUNT + 1)
+        self.assertEqual(count(other), 1)
+
+    def test_follow_feed_count(self):
+        reader = User.objects.create_user('reader')
+        Follow.objects.create(user=reader, author=self.user)
+
+        def count():
+            merged = merged_authors(reader)
+            return FeedPaginator(follow_feed(reader, merged), PAGINATOR_COUNT,
+                                 scopes=follow_scopes(reader, merged)).count
+
+        self.assertEqual(count(), PAGINATOR_COUNT + 1)
+        Post.objects.create(text=TEST_TEXT, author=self.user)
+        self.assertEqual(count(), PAGINATOR_COUNT + 2)
+        Post.objects.filter(author=self.user).first().delete()
+        self.assertEqual(count(), PAGINATOR_COUNT + 1)
+
+    def test_long_feed_keeps_estimate(self):
+        self.count()
+        Post.objects.create(text=TEST_TEXT, author=self.user)
+        with mock.patch('posts.paginator.PAGINATOR_EXACT_COUNT_LIMIT',
+                        PAGINATOR_COUNT):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.count(), PAGINATOR_COUNT + 1)
+
+    def test_elided_page_range(self):
+        paginator = FeedPaginator(list(range(200)), 1)
+        ellipsis = FeedPaginator.ELLIPSIS
+        cases = [
+            [1, [1, 2, 3, 4, ellipsis, 199, 200]],
+            [100, [1, 2, ellipsis, 97, 98, 99, 100, 101, 102, 103,
+                   ellipsis, 199, 200]],
+            [200, [1, 2, ellipsis, 197, 198, 199, 200]],
+        ]
+        for number, expected in cases:
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), expected)
+        self.assertEqual(
+            list(FeedPaginator(list(range(5)), 1).get_elided_page_range(3)),
+            [1, 2, 3, 4, 5])
@@ -0,0 +1,54 @@
+import marshal
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+PROFILE_URL = reverse('profile', args=['leo'])
+
+
+class ProfilerTest(TestCase):
+    """Профиль запроса по ?prof только для сотрудников"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('leo')
+        cls.staff = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        Post.objects.create(text='пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+    def test_report(self):
+        response = self.client.get(PROFILE_URL, {'prof': 'tottime'})
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn('Ordered by: internal time', report)
+        self.assertIn('SQL queries', report)
+        # место запроса — код приложения, а не middleware
+        self.assertRegex(report, r'ms  posts/\w+\.py:\d+ ')
+        self.assertNotIn('profiling.py:', report.split('SQL queries')[1])
+
+    def test_header_and_raw(self):
+        response = self.client.get(PROFILE_URL, HTTP_X_PROFILE='')
+        self.assertIn('Ordered by: cumulative time',
+                      response.content.decode())
+        raw = self.client.get(PROFILE_URL, {'prof': 'raw'})
+        self.assertIsInstance(marshal.loads(raw.content), dict)
+        self.assertEqual(
+            self.client.get(PROFILE_URL, {'prof': 'nope'}).status_code, 400)
+
+    def test_regular_users_get_page(self):
+        for client in (Client(), self.client):
+            if client is self.client:
+                client.force_login(self.user)
+            response = client.get(PROFILE_URL, {'prof': ''})
+            self.assertEqual(response['Content-Type'],
+                             'text/html; charset=utf-8')
+            self.assertNotIn('SQL queries', response.content.decode())
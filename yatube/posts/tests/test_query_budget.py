@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.settings import PAGINATOR_COUNT
+from posts.tests.utils import QueryBudgetMixin
+
+TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
+TEST_SLUG = 'test-slug'
+TEST_TITLE = 'test-title'
+TEST_TEXT = 'test-text'
+HOMEPAGE_URL = reverse('index')
+GROUP_URL = reverse('group_posts', kwargs={'slug': TEST_SLUG})
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+FOLLOW_INDEX = reverse('follow_index')
+AUTHORS = 3
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов страницы не зависит от числа постов и комментариев"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.reader = User.objects.create_user(TEST_USERNAME_2)
+        cls.group = Group.objects.create(title=TEST_TITLE, slug=TEST_SLUG)
+        authors = [cls.user] + [
+            User.objects.create_user(f'author-{number}')
+            for number in range(AUTHORS)]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for number in range(PAGINATOR_COUNT * 2):
+            post = Post.objects.create(
+                text=TEST_TEXT,
+                author=authors[number % len(authors)],
+                group=cls.group)
+        for author in authors:
+            Comment.objects.create(post=post, author=author, text=TEST_TEXT)
+        cls.POST_URL = reverse('post', kwargs={
+            'username': post.author.username, 'post_id': post.id})
+        cls.guest_client = Client()
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def test_query_budget(self):
+        # сессия и пользователь авторизованного клиента — ещё 2 запроса;
+        # прочитанное валидатором ETag вьюха не перечитывает
+        budgets = [
+            [HOMEPAGE_URL, self.guest_client, 2],
+            [GROUP_URL, self.guest_client, 3],
+            [PROFILE_URL, self.guest_client, 3],
+            [self.POST_URL, self.guest_client, 2],
+            [HOMEPAGE_URL, self.reader_client, 4],
+            [GROUP_URL, self.reader_client, 5],
+            [PROFILE_URL, self.reader_client, 5],
+            [self.POST_URL, self.reader_client, 4],
+            [FOLLOW_INDEX, self.reader_client, 5],
+        ]
+        for url, client, budget in budgets:
+            with self.subTest(url=url, client=client):
+                cache.clear()
+                self.assertQueryBudget(client, url, budget)
+
+    def test_query_plans(self):
+        """Запросы страниц идут по индексам, без сортировок"""
+        call_command('audit_queries', '--strict', stdout=StringIO())
@@ -0,0 +1,137 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import (FTS_TABLE, decode_cursor, encode_cursor,
+                          ensure_index, has_fts, match_expression,
+                          search_posts)
+
+TEST_USERNAME = 'mike'
+SEARCH_URL = reverse('search')
+ADMIN_URL = reverse('admin:posts_post_changelist')
+
+
+class MatchExpressionTest(TestCase):
+    def test_expression(self):
+        cases = {
+            'Кот': '"кот"*',
+            'рыжий кот': '"рыжий" "кот"*',
+            'кот OR "пёс': '"кот" "or" "пёс"*',
+            'NEAR(a b)*': '"near" "a" "b"*',
+            ' !!! ': '',
+        }
+        for query, expression in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(match_expression(query), expression)
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(-1.5, 7)), (-1.5, 7))
+        for token in ['', 'мусор', encode_cursor(-1.5, 7)[:-2]]:
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+
+
+class SearchTest(TestCase):
+    """Поиск по индексу FTS5: ранжирование, синхронизация, курсоры"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.weak = Post.objects.create(
+            text='рыжий кот спал на длинном тёплом подоконнике весь день',
+            author=cls.user)
+        cls.strong = Post.objects.create(text='кот и кот', author=cls.user)
+        cls.other = Post.objects.create(text='собака', author=cls.user)
+
+    def setUp(self):
+        if not has_fts():
+            self.skipTest('SQLite без FTS5')
+
+    def found(self, query):
+        return list(search_posts(query))
+
+    def test_ranking(self):
+        self.assertEqual(self.found('кот'), [self.strong, self.weak])
+        self.assertEqual(self.found('рыжий кот'), [self.weak])
+
+    def test_prefix_and_case(self):
+        self.assertEqual(self.found('подокон'), [self.weak])
+        self.assertEqual(self.found('ТЁПЛОМ'), [self.weak])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.create(text='ёжик в тумане', author=self.user)
+        self.assertEqual(self.found('ёжик'), [post])
+        post.text = 'лошадь в тумане'
+        post.save()
+        self.assertEqual(self.found('ёжик'), [])
+        Post.objects.filter(id=post.id).update(text='ёжик вернулся')
+        self.assertEqual(self.found('вернулся'), [post])
+        post.delete()
+        self.assertEqual(self.found('ёжик'), [])
+
+    def test_fts_syntax_is_harmless(self):
+        for query in ['кот OR', '"кот', 'кот*', 'NOT кот', 'text:кот',
+                      '^кот', '!!!']:
+            with self.subTest(query=query):
+                search_posts(query)
+
+    def test_pages_by_cursor(self):
+        posts = [Post.objects.create(text=f'ёж номер {number}',
+                                     author=self.user)
+                 for number in range(5)]
+        page = search_posts('ёж', per_page=2)
+        seen = list(page)
+        self.assertFalse(page.has_previous())
+        while page.has_next():
+            page = search_posts('ёж', after=page.next_cursor, per_page=2)
+            self.assertTrue(page.has_previous())
+            seen.extend(page)
+        self.assertEqual(sorted(seen, key=lambda post: post.id), posts)
+        self.assertEqual(len(seen), len(posts))
+        back = search_posts('ёж', before=page.previous_cursor, per_page=2)
+        self.assertEqual(list(back), seen[2:4])
+        self.assertTrue(back.has_next())
+        # курсор за краем выдачи открывает первую страницу
+        edge = search_posts('ёж', after=page.next_cursor, per_page=2)
+        self.assertEqual(list(edge), seen[:2])
+        self.assertFalse(edge.has_previous())
+
+    def test_index_restored(self):
+        """Потерянные триггеры возвращаются, индекс перестраивается"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {FTS_TABLE}_insert')
+        post = Post.objects.create(text='потерянный', author=self.user)
+        self.assertEqual(self.found('потерянный'), [])
+        self.assertTrue(ensure_index())
+        self.assertEqual(self.found('потерянный'), [post])
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.staff = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.post = Post.objects.create(text='рыжий кот', author=cls.user)
+        Post.objects.create(text='собака', author=cls.user)
+
+    def test_search_page(self):
+        response = Client().get(SEARCH_URL, {'q': 'рыж'})
+        self.assertEqual(list(response.context['page']), [self.post])
+        self.assertContains(response, self.post.text)
+
+    def test_empty_query(self):
+        for query in ['', '   ', '!!!']:
+            with self.subTest(query=query):
+                response = Client().get(SEARCH_URL, {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['page'])
+
+    def test_admin_search(self):
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(ADMIN_URL, {'q': 'кот'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Post, StoredImage, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+USERS = 40
+POSTS = 300
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedDataTest(TestCase):
+    """Синтетические данные и замер страниц на них"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT):
+            call_command('seed_data', users=USERS, posts=POSTS, groups=3,
+                         follows=5, images=2, image_ratio=0.2,
+                         no_thumbnails=True, stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_rows_and_counters(self):
+        self.assertEqual(Post.objects.count(), POSTS)
+        self.assertEqual(UserStats.objects.aggregate(
+            total=Sum('posts_count'))['total'], POSTS)
+        self.assertEqual(Post.objects.aggregate(
+            total=Sum('comment_count'))['total'], Comment.objects.count())
+        self.assertEqual(
+            StoredImage.objects.aggregate(total=Sum('refs'))['total'],
+            Post.objects.exclude(image='').exclude(image=None).count())
+        # в очереди миниатюр только посты с картинкой
+        self.assertEqual(
+            Post.objects.filter(thumbnails_ready=False).count(),
+            Post.objects.exclude(image='').exclude(image=None).count())
+        self.assertTrue(Post.objects.filter(thumbnails_ready=True).exists())
+
+    def test_power_law(self):
+        """Самый популярный автор пишет и собирает больше медианного"""
+        for field in ('posts_count', 'followers_count'):
+            with self.subTest(field=field):
+                values = sorted(UserStats.objects.values_list(
+                    field, flat=True))
+                self.assertGreater(values[-1], 3 * values[len(values) // 2])
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+
+    def test_benchmark_report(self):
+        path = os.path.join(TEMP_MEDIA_ROOT, 'report.json')
+        call_command('benchmark_views', requests=3, warmup=0, output=path,
+                     stdout=StringIO())
+        call_command('benchmark_views', requests=3, warmup=0,
+                     compare=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['rows']['Post'], POSTS)
+        for name, result in report['views'].items():
+            with self.subTest(view=name):
+                self.assertEqual(result['status'], 200)
+                self.assertGreater(result['queries'], 0)
+                self.assertLessEqual(result['p50'], result['p99'])
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SQLiteCache
+
+TEST_KEY = 'key'
+TEST_VALUE = {'page': 'content'}
+
+
+def _set_in_child(cache):
+    cache.set(TEST_KEY, TEST_VALUE)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Общий для процессов кэш в файле SQLite"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(os.path.join(self.directory, 'cache.sqlite3'),
+                           {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        cache = self.cache
+        cache.set(TEST_KEY, TEST_VALUE)
+        self.assertEqual(cache.get(TEST_KEY), TEST_VALUE)
+        self.assertFalse(cache.add(TEST_KEY, 'другое'))
+        self.assertTrue(cache.add('new', 1))
+        self.assertEqual(cache.incr('new', 2), 3)
+        self.assertEqual(cache.get_many([TEST_KEY, 'new', 'missing']),
+                         {TEST_KEY: TEST_VALUE, 'new': 3})
+        cache.delete_many([TEST_KEY, 'new'])
+        self.assertIsNone(cache.get(TEST_KEY))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_expiry(self):
+        self.cache.set(TEST_KEY, TEST_VALUE, 0)
+        self.assertFalse(self.cache.has_key(TEST_KEY))
+        self.assertTrue(self.cache.add(TEST_KEY, TEST_VALUE, None))
+        self.assertTrue(self.cache.has_key(TEST_KEY))
+
+    def test_lru_eviction_by_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for number in range(3):
+            cache.set(number, number)
+        # запись 0 прочитана позже остальных и переживёт вытеснение
+        cache._db.execute('UPDATE cache SET accessed = accessed + 10 '
+                          'WHERE key = ?', [cache.make_key(0)])
+        cache.set(3, 3)
+        self.assertEqual(cache.get_many(range(4)), {0: 0, 2: 2, 3: 3})
+
+    def test_zero_cull_frequency_clears(self):
+        """CULL_FREQUENCY=0, как у DatabaseCache, очищает кэш целиком"""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=0)
+        for number in range(4):
+            cache.set(number, number)
+        self.assertEqual(cache.get_many(range(4)), {3: 3})
+
+    def test_eviction_by_size(self):
+        cache = self.make_cache(MAX_SIZE=10000)
+        for number in range(10):
+            cache.set(number, 'x' * 2000)
+        entries, size = cache._db.execute(
+            'SELECT entries, size FROM stats').fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(entries, len(cache.get_many(range(10))))
+        self.assertIn(9, cache.get_many(range(10)))
+
+    def test_shared_between_processes(self):
+        process = multiprocessing.get_context('fork').Process(
+            target=_set_in_child, args=(self.cache,))
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get(TEST_KEY), TEST_VALUE)
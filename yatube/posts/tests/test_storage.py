@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import Post, StoredImage, User
+from posts.storage import ContentAddressedStorage, is_sharded, post_images
+from posts.thumbnails import cached_thumbnail, delete_unused, thumbnail
+
+TEST_USERNAME = 'mike'
+TEST_TEXT = 'test-text'
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PICTURE = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+           b'\x01\x00\x80\x00\x00\x00\x00\x00'
+           b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+           b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+           b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+           b'\x0A\x00\x3B')
+OTHER_PICTURE = PICTURE.replace(b'\xFF\xFF\xFF', b'\xFF\x00\x00')
+CARD = 'card-960-jpeg'
+LEGACY_IMAGE = 'posts/legacy.gif'
+MISSING_IMAGE = 'posts/missing.gif'
+
+
+def uploaded(name='small.gif', content=PICTURE):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+class MediaTestMixin:
+    def setUp(self):
+        # kvstore sorl живёт в кэше и переживает откат базы
+        cache.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create(self, image):
+        return Post.objects.create(
+            text=TEST_TEXT, author=self.user, image=image)
+
+    def refs(self, post):
+        return StoredImage.objects.get(name=post.image.name).refs
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(MediaTestMixin, TestCase):
+    """Одинаковые загрузки делят один файл"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+
+    def test_identical_uploads_share_file(self):
+        first = self.create(uploaded('first.gif'))
+        second = self.create(uploaded('second.GIF'))
+        other = self.create(uploaded('first.gif', OTHER_PICTURE))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_sharded(first.image.name))
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(
+            first.image.path))), 1)
+        self.assertEqual(self.refs(first), 2)
+        self.assertEqual(self.refs(other), 1)
+
+    def test_shared_file_has_one_thumbnail_set(self):
+        first = self.create(uploaded('first.gif'))
+        second = self.create(uploaded('second.gif'))
+        generated = thumbnail(first.image, CARD)
+        self.assertEqual(cached_thumbnail(second.image, CARD).name,
+                         generated.name)
+
+    def test_image_change_moves_reference(self):
+        post = self.create(uploaded())
+        keeper = self.create(uploaded())
+        post.image = uploaded(content=OTHER_PICTURE)
+        post.save()
+        self.assertEqual(self.refs(keeper), 1)
+        self.assertEqual(self.refs(post), 1)
+        post.text = TEST_TEXT * 2
+        post.save()
+        self.assertEqual(self.refs(post), 1)
+
+    def test_recount_restores_references(self):
+        post = self.create(uploaded())
+        self.create(uploaded())
+        StoredImage.objects.all().delete()
+        call_command('recount_counters', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.refs(post), 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ReleaseImageTest(MediaTestMixin, TransactionTestCase):
+    """Файл удаляется вместе с последней ссылкой на него"""
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(TEST_USERNAME)
+
+    def test_file_kept_while_referenced(self):
+        first = self.create(uploaded())
+        second = self.create(uploaded())
+        generated = thumbnail(first.image, CARD)
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(generated.exists())
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(generated.exists())
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_replaced_image_removed(self):
+        post = self.create(uploaded())
+        path = post.image.path
+        post.image = uploaded(content=OTHER_PICTURE)
+        post.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_upload_survives_concurrent_delete(self):
+        """Удаление последней ссылки между save и _retain не теряет файл"""
+        post = self.create(uploaded())
+        name = post.image.name
+        # пост удалён, отложенный delete_unused ещё не отработал
+        StoredImage.objects.filter(name=name).update(refs=0)
+        save = ContentAddressedStorage.save
+        deleted = []
+
+        def save_then_delete(storage, *args, **kwargs):
+            saved = save(storage, *args, **kwargs)
+            if not deleted:
+                deleted.append(delete_unused(saved))
+            return saved
+
+        with mock.patch.object(ContentAddressedStorage, 'save',
+                               save_then_delete):
+            other = self.create(uploaded())
+        self.assertEqual(deleted, [True])
+        self.assertEqual(other.image.name, name)
+        self.assertTrue(post_images.exists(name))
+        self.assertEqual(self.refs(other), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ShardMediaTest(MediaTestMixin, TransactionTestCase):
+    """shard_media переносит старые файлы в шарды по хешу"""
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(TEST_USERNAME)
+        # файлы из плоского каталога posts/ до шардирования
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(TEMP_MEDIA_ROOT, LEGACY_IMAGE), 'wb') as file:
+            file.write(PICTURE)
+        self.legacy = [self.create(LEGACY_IMAGE) for _ in range(2)]
+        self.missing = self.create(MISSING_IMAGE)
+        self.sharded = self.create(uploaded())
+
+    def shard(self, *args):
+        call_command('shard_media', '--batch=1', '--workers=1', *args,
+                     stdout=open(os.devnull, 'w'))
+
+    def test_dry_run_changes_nothing(self):
+        self.shard('--dry-run')
+        self.assertEqual(Post.objects.filter(image=LEGACY_IMAGE).count(), 2)
+        self.assertTrue(post_images.exists(LEGACY_IMAGE))
+
+    def test_legacy_files_moved(self):
+        self.shard()
+        self.shard()
+        for post in self.legacy:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, self.sharded.image.name)
+            self.assertTrue(post.thumbnails_ready)
+        self.assertFalse(post_images.exists(LEGACY_IMAGE))
+        self.assertEqual(self.refs(self.sharded), 3)
+        self.assertFalse(StoredImage.objects.filter(
+            name=LEGACY_IMAGE).exists())
+        self.missing.refresh_from_db()
+        self.assertEqual(self.missing.image.name, MISSING_IMAGE)
+
+    def test_resume_after_name(self):
+        self.shard(f'--after={LEGACY_IMAGE}')
+        self.assertTrue(post_images.exists(LEGACY_IMAGE))
@@ -0,0 +1,156 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.settings import THUMBNAIL_SIZES
+from posts.thumbnails import (cached_thumbnail, pending, prefetch_thumbnails,
+                              thumbnail)
+
+TEST_USERNAME = 'mike'
+TEST_TEXT = 'test-text'
+NEW_TEXT = 'new-text'
+PROFILE_URL = reverse('profile', kwargs={'username': TEST_USERNAME})
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PICTURE = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+           b'\x01\x00\x80\x00\x00\x00\x00\x00'
+           b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+           b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+           b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+           b'\x0A\x00\x3B')
+# другой цвет палитры: другой файл
+OTHER_PICTURE = PICTURE.replace(b'\xFF\xFF\xFF', b'\xFF\x00\x00')
+PLACEHOLDER = 'card-img bg-light'
+IMAGE_POSTS = 3
+CARD = 'card-960-jpeg'
+
+
+def uploaded(name='small.gif', content=PICTURE):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTest(TestCase):
+    """Миниатюры режутся воркером, а не при рендере страницы"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(TEST_USERNAME)
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text=TEST_TEXT, author=self.user, image=uploaded())
+
+    def generate(self, *args):
+        call_command('generate_thumbnails', '--workers=1', *args,
+                     stdout=StringIO())
+
+    def test_new_image_shows_placeholder(self):
+        self.assertIn(self.post, pending())
+        response = self.guest_client.get(PROFILE_URL)
+        self.assertContains(response, PLACEHOLDER)
+        self.assertNotContains(response, '<img class="card-img"')
+
+    def test_worker_makes_thumbnails(self):
+        version = self.post.version
+        self.generate()
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnails_ready)
+        self.assertEqual(self.post.version, version + 1)
+        self.assertEqual(cached_thumbnail(self.post.image, CARD).name,
+                         thumbnail(self.post.image, CARD).name)
+        response = self.guest_client.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img"')
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_picture_variants(self):
+        self.generate()
+        response = self.guest_client.get(PROFILE_URL)
+        self.assertContains(response, '<source type="image/webp"')
+        for size in THUMBNAIL_SIZES:
+            with self.subTest(size=size):
+                image = cached_thumbnail(self.post.image, size)
+                self.assertContains(response, f'{image.url} {image.width}w')
+        self.assertTrue(cached_thumbnail(
+            self.post.image, 'card-480-webp').name.endswith('.webp'))
+
+    def test_all_fills_missing_variants(self):
+        """--all дорезает варианты, не пряча готовые картинки"""
+        Post.objects.filter(pk=self.post.pk).update(thumbnails_ready=True)
+        thumbnail(self.post.image, CARD)
+        response = self.guest_client.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img"')
+        self.assertNotContains(response, '<source')
+        self.generate('--all')
+        cache.clear()
+        self.assertContains(self.guest_client.get(PROFILE_URL),
+                            '<source type="image/webp"')
+
+    def test_only_new_image_requeues(self):
+        self.generate()
+        self.post.refresh_from_db()
+        self.post.text = NEW_TEXT
+        self.post.save()
+        self.assertNotIn(self.post, pending())
+        self.post.image = uploaded('other.gif', OTHER_PICTURE)
+        self.post.save()
+        self.assertIn(self.post, pending())
+
+    def test_text_posts_stay_out_of_queue(self):
+        text_post = Post.objects.create(text=TEST_TEXT, author=self.user)
+        self.assertTrue(text_post.thumbnails_ready)
+        self.assertEqual(Post.objects.filter(thumbnails_ready=False).count(),
+                         1)
+        self.post.image = None
+        self.post.save()
+        self.assertTrue(self.post.thumbnails_ready)
+
+    def test_broken_image_leaves_queue(self):
+        broken = self.post.image.storage.save(
+            'posts/broken.gif', StringIO('не картинка'))
+        Post.objects.filter(pk=self.post.pk).update(image=broken)
+        with self.assertLogs('sorl.thumbnail', 'ERROR'), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.generate()
+        self.assertFalse(pending().exists())
+        self.assertContains(self.guest_client.get(PROFILE_URL), PLACEHOLDER)
+
+    def test_page_looks_up_thumbnails_once(self):
+        for number in range(IMAGE_POSTS - 1):
+            Post.objects.create(text=TEST_TEXT, author=self.user,
+                                image=uploaded(f'{number}.gif'))
+        self.generate()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img"',
+                            count=IMAGE_POSTS)
+        self.assertEqual(len([query for query in queries
+                              if 'thumbnail_kvstore' in query['sql']]), 1)
+
+    def test_prefetch_matches_lookup(self):
+        self.generate()
+        post = Post.objects.get(pk=self.post.pk)
+        cache.clear()
+        prefetch_thumbnails([post])
+        self.assertEqual(post.thumbnails[CARD].name,
+                         cached_thumbnail(post.image, CARD).name)
+        self.assertEqual(post.thumbnails[CARD].size,
+                         cached_thumbnail(post.image, CARD).size)
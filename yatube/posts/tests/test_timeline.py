@@ -0,0 +1,93 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User
+
+TEST_USERNAME = 'mike'
+TEST_USERNAME_2 = 'charly'
+TEST_TEXT = 'test-text'
+FOLLOW_INDEX = reverse('follow_index')
+FOLLOW_URL = reverse('profile_follow', kwargs={'username': TEST_USERNAME})
+UNFOLLOW_URL = reverse('profile_unfollow', kwargs={'username': TEST_USERNAME})
+
+
+class TimelineTest(TestCase):
+    """Материализованная лента подписок"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(TEST_USERNAME)
+        cls.reader = User.objects.create_user(TEST_USERNAME_2)
+        cls.old_post = Post.objects.create(text=TEST_TEXT, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        return list(self.reader_client.get(FOLLOW_INDEX).context['page'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.reader_client.get(FOLLOW_URL)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+        self.reader_client.get(UNFOLLOW_URL)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 0)
+    def test_popular_author_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def deliver(self):
+        call_command('fan_out_posts', stdout=StringIO())
+
+    @mock.patch('posts.timeline.TIMELINE_INLINE_FANOUT', 0)
+    def test_large_audience_goes_to_worker(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        post.refresh_from_db()
+        self.assertTrue(post.timeline_pending)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        # до раскладки пост подмешивается при чтении
+        self.assertEqual(self.feed(), [post, self.old_post])
+        self.deliver()
+        post.refresh_from_db()
+        self.assertFalse(post.timeline_pending)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1)
+    def test_author_below_limit_keeps_posts(self):
+        """Посты, опубликованные выше порога, не пропадают под ним"""
+        other = User.objects.create_user('other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text=TEST_TEXT, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.get(user=other).delete()
+        self.assertEqual(self.feed(), [post, self.old_post])
+        self.deliver()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
@@ -0,0 +1,106 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import timing
+
+INDEX_URL = reverse('index')
+EXPORT_URL = reverse('export', args=['posts'])
+
+
+def metrics(response):
+    """{имя: параметры} из заголовка Server-Timing."""
+    result = {}
+    for metric in re.split(r', (?=\w+;)', response['Server-Timing']):
+        name, *params = metric.split(';')
+        result[name] = dict(param.split('=', 1) for param in params)
+    return result
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTest(TestCase):
+    """Замеры запроса в Server-Timing и сводка по маршрутам"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('leo')
+        cls.post = Post.objects.create(text='пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_header(self):
+        first = metrics(self.client.get(
+            reverse('profile', args=['leo'])))
+        self.assertGreater(int(re.match(r'"(\d+) queries"',
+                                        first['db']['desc']).group(1)), 0)
+        self.assertGreater(float(first['tpl']['dur']), 0)
+        self.assertGreaterEqual(float(first['total']['dur']),
+                                float(first['db']['dur']))
+        self.assertIn('misses', first['cache']['desc'])
+        # вторая главная отдаётся из cache_page: попадание без шаблона
+        self.client.get(INDEX_URL)
+        second = metrics(self.client.get(INDEX_URL))
+        self.assertNotEqual(second['cache']['desc'], '"0 hits, 0 misses"')
+        self.assertEqual(second['tpl']['dur'], '0.0')
+
+    def test_report(self):
+        timing.reset()
+        with mock.patch.object(timing, 'FLUSH_INTERVAL', 0):
+            self.client.get(INDEX_URL)
+            self.client.get(INDEX_URL)
+            self.client.get('/missing-page/nowhere/')
+        report = timing.report()
+        self.assertEqual(report['index']['requests'], 2)
+        self.assertGreater(report['index']['total'], 0)
+        self.assertIn(timing.UNRESOLVED, report)
+        out = StringIO()
+        call_command('timing_report', '--reset', stdout=out)
+        self.assertIn('index', out.getvalue())
+        self.assertEqual(timing.report(), {})
+
+    def test_workers_keep_each_others_names(self):
+        """Воркер со своим набором имён не затирает имена другого"""
+        timing.reset()
+        first, second = (timing.ServerTimingMiddleware(None)
+                         for _ in range(2))
+        totals = dict.fromkeys(timing.TIMES + timing.COUNTS, 1)
+        first.flush({'index': totals})
+        # второй воркер прочитал бы список до записи первого
+        with mock.patch.object(cache, 'get', return_value=None):
+            second.flush({'group': totals})
+        first.flush({'index': totals})
+        report = timing.report()
+        self.assertEqual(set(report), {'index', 'group'})
+        self.assertEqual(report['index']['requests'], 2)
+        self.assertEqual(cache.get(timing.SLOTS_KEY), 2)
+
+    def test_streaming_recorded_at_close(self):
+        """Потоковый ответ замеряется до конца тела, без заголовка"""
+        timing.reset()
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        with mock.patch.object(timing, 'FLUSH_INTERVAL', 0), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(EXPORT_URL)
+            self.assertNotIn('Server-Timing', response)
+            self.assertNotIn('export', timing.report())
+            b''.join(response.streaming_content)
+            response.close()
+        report = timing.report()
+        self.assertEqual(report['export']['requests'], 1)
+        # запросы выгрузки идут при чтении тела
+        self.assertEqual(report['export']['queries'], len(queries))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(INDEX_URL))
@@ -0,0 +1,16 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка числа SQL-запросов, которые делает страница."""
+
+    def assertQueryBudget(self, client, url, budget):
+        """Запрос к url выполняет не больше budget SQL-запросов."""
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        if len(queries) > budget:
+            self.fail('{}: {} SQL-запросов при бюджете {}:\n{}'.format(
+                url, len(queries), budget,
+                '\n'.join(query['sql'] for query in queries)))
+        return response
@@ -0,0 +1,180 @@
+"""Миниатюры картинок постов готовятся вне запроса.
+
+Пост с новой картинкой получает thumbnails_ready=False и ждёт в очереди,
+пока generate_thumbnails не нарежет все размеры THUMBNAIL_SIZES. Шаблон
+только ищет готовую миниатюру в kvstore sorl: пока её нет, карточка
+показывает заглушку, и ни один запрос не декодирует картинку.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import F
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .models import Post, StoredImage
+from .page_cache import invalidate_post_pages
+from .settings import THUMBNAIL_BATCH, THUMBNAIL_SIZES, THUMBNAIL_WORKERS
+from .storage import post_images
+
+logger = logging.getLogger(__name__)
+
+
+def pending():
+    """Посты, картинки которых ждут миниатюр."""
+    return Post.objects.filter(thumbnails_ready=False, image__gt='')
+
+
+def source(image):
+    """Картинка поста для sorl: имя или FieldFile в хранилище постов."""
+    # класс хранилища входит в ключ kvstore, а от него — имена миниатюр
+    return ImageFile(image, post_images)
+
+
+def thumbnail(image, size):
+    """Миниатюра картинки в размере из THUMBNAIL_SIZES; режет при нужде."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    return get_thumbnail(source(image), geometry, **options)
+
+
+def thumbnail_file(image, size):
+    """Файл миниатюры под тем именем, которое даст ей sorl."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    options = dict(options)
+    backend = default.backend
+    source_file = source(image)
+    # опции дополняются так же, как в ThumbnailBackend.get_thumbnail
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source_file))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source_file, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(image, size):
+    """Нарезанная миниатюра из kvstore или None; картинку не трогает."""
+    return default.kvstore.get(thumbnail_file(image, size))
+
+
+def _get_many_raw(keys):
+    """Значения kvstore: один get_many кэша и один запрос за промахами."""
+    kvstore = default.kvstore
+    if not keys:
+        return {}
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        # отсутствие тоже кэшируется, как в KVStore._get_raw
+        found = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {key: None if value == EMPTY_VALUE else value
+            for key, value in values.items()}
+
+
+def prefetch_thumbnails(posts, sizes=THUMBNAIL_SIZES):
+    """Миниатюры всех постов страницы разом, в post.thumbnails[size]."""
+    files = {}
+    for post in posts:
+        post.thumbnails = {}
+        if post.image and post.thumbnails_ready:
+            for size in sizes:
+                files[post, size] = add_prefix(
+                    thumbnail_file(post.image, size).key)
+    values = _get_many_raw(list(set(files.values())))
+    for (post, size), key in files.items():
+        value = values.get(key)
+        post.thumbnails[size] = value and deserialize_image_file(value)
+    return posts
+
+
+def generate(name):
+    """Нарезает все размеры одной картинки; True, если без ошибок."""
+    try:
+        for size in THUMBNAIL_SIZES:
+            # битую картинку sorl не режет, а только пишет в лог
+            if not thumbnail(name, size).exists():
+                logger.error('Не удалось нарезать миниатюру %s: %s',
+                             size, name)
+                return False
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры %s', name)
+        return False
+    return True
+
+
+def _generate_in_pool(name):
+    try:
+        return generate(name)
+    finally:
+        # у каждого потока пула своё соединение с базой
+        connection.close()
+
+
+def process(names, workers=THUMBNAIL_WORKERS):
+    """Нарезает картинки и публикует посты с ними: (готово, ошибок)."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return 0, 0
+    if workers > 1:
+        # PIL отпускает GIL на декодировании и ресайзе
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_generate_in_pool, names))
+    else:
+        results = [generate(name) for name in names]
+    # битая картинка тоже уходит из очереди и остаётся заглушкой:
+    # повторять её декодирование на каждом проходе бессмысленно
+    posts = Post.objects.filter(image__in=names)
+    ids = list(posts.values_list('id', flat=True))
+    posts.filter(id__in=ids).update(
+        thumbnails_ready=True, version=F('version') + 1)
+    invalidate_post_pages(*ids)
+    failed = results.count(False)
+    return len(names) - failed, failed
+
+
+def process_pending(batch=THUMBNAIL_BATCH, workers=THUMBNAIL_WORKERS):
+    """Один проход очереди: (готово, ошибок)."""
+    return process(pending().order_by('id').values_list(
+        'image', flat=True)[:batch], workers)
+
+
+def post_thumbnail(post, size):
+    """Готовая миниатюра картинки поста или None, пока её нарезают."""
+    if not post.image or not post.thumbnails_ready:
+        return None
+    # страница уже собрала миниатюры через prefetch_thumbnails
+    if hasattr(post, 'thumbnails'):
+        return post.thumbnails.get(size)
+    return cached_thumbnail(post.image, size)
+
+
+def delete_unused(name):
+    """Удаляет файл и его миниатюры, если ссылок на него не осталось."""
+    with transaction.atomic():
+        # строка с нулём удаляется один раз, даже если постов удалили много
+        if not StoredImage.objects.filter(name=name, refs=0).delete()[0]:
+            return False
+        # файл уходит до коммита: _retain той же картинки ждёт блокировку
+        # строки и после неё видит, что файла уже нет
+        try:
+            delete(source(name))
+        except Exception:
+            logger.exception('Не удалось удалить картинку %s', name)
+    return True
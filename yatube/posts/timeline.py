@@ -0,0 +1,202 @@
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import invalidate_feed_counts
+from .settings import (TIMELINE_BACKFILL, TIMELINE_FANOUT_BATCH,
+                       TIMELINE_FANOUT_LIMIT, TIMELINE_INLINE_FANOUT)
+
+# bulk_create в SQLite: не больше 500 строк в составном SELECT
+BATCH_SIZE = 500
+
+
+def fans_out(author_id):
+    """Раскладываются ли посты автора по лентам при публикации."""
+    return not UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=TIMELINE_FANOUT_LIMIT).exists()
+
+
+def _insert_entries(select, params):
+    """INSERT ... SELECT в ленты; уже разложенные посты пропускаются.
+
+    select отдаёт колонки (user_id, post_id, author_id, pub_date).
+    """
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '{insert} {table} (user_id, post_id, author_id, pub_date) '
+            '{select} {suffix}'.format(
+                insert=ops.insert_statement(ignore_conflicts=True),
+                table=ops.quote_name(TimelineEntry._meta.db_table),
+                select=select,
+                suffix=ops.ignore_conflicts_suffix_sql(
+                    ignore_conflicts=True)),
+            params)
+
+
+def deliver(post_ids):
+    """Раскладывает посты по лентам подписчиков и снимает их с очереди.
+
+    Строки ленты собирает сама база, одним запросом на все посты.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    ops = connection.ops
+    with transaction.atomic():
+        _insert_entries(
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            'FROM {follows} follow INNER JOIN {posts} post '
+            'ON follow.author_id = post.author_id '
+            'WHERE post.id IN ({ids})'.format(
+                follows=ops.quote_name(Follow._meta.db_table),
+                posts=ops.quote_name(Post._meta.db_table),
+                ids=', '.join(['%s'] * len(post_ids))),
+            post_ids)
+        Post.objects.filter(id__in=post_ids, timeline_pending=True).update(
+            timeline_pending=False)
+    invalidate_feed_counts(*(f'follow:{user_id}' for user_id in Follow.objects
+                             .filter(author__posts__id__in=post_ids)
+                             .values_list('user_id', flat=True).distinct()))
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора.
+
+    Немногих подписчиков — сразу, одним запросом; для многих пост
+    встаёт в очередь fan_out_posts и до раскладки подмешивается при
+    чтении. Посты авторов выше TIMELINE_FANOUT_LIMIT не раскладываются.
+    """
+    if post.author_id is None:
+        return
+    followers = UserStats.objects.filter(user_id=post.author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    if not followers or followers > TIMELINE_FANOUT_LIMIT:
+        return
+    if followers > TIMELINE_INLINE_FANOUT:
+        Post.objects.filter(pk=post.pk).update(timeline_pending=True)
+    else:
+        deliver([post.pk])
+
+
+def deliver_pending(batch=TIMELINE_FANOUT_BATCH):
+    """Один проход очереди fan_out_posts: сколько постов разложено."""
+    post_ids = list(Post.objects.filter(timeline_pending=True).order_by(
+        'id').values_list('id', flat=True)[:batch])
+    deliver(post_ids)
+    return len(post_ids)
+
+
+def follower_lost(author_id):
+    """Ставит в очередь посты автора, опустившегося до порога.
+
+    Пока подписчиков было больше TIMELINE_FANOUT_LIMIT, его посты только
+    подмешивались при чтении; теперь их разложит fan_out_posts.
+    """
+    if not UserStats.objects.filter(
+            user_id=author_id,
+            followers_count=TIMELINE_FANOUT_LIMIT).exists():
+        return
+    latest = list(Post.objects.filter(author_id=author_id).values_list(
+        'id', flat=True)[:TIMELINE_BACKFILL])
+    Post.objects.filter(id__in=latest).update(timeline_pending=True)
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if not fans_out(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'id', 'pub_date')[:TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=follow.user_id, post_id=post_id,
+                       author_id=follow.author_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def rebuild(author_ids, user_ids=None):
+    """Раскладывает последние посты авторов по лентам их подписчиков.
+
+    Для записей, загруженных в обход сигналов; уже разложенные посты
+    не дублируются. user_ids ограничивает ленты этими читателями.
+    Строки ленты собирает сама база: INSERT ... SELECT на автора
+    вместо объектов в Python.
+    """
+    posts = Post.objects.order_by('-pub_date', '-id').values(
+        'id', 'author_id', 'pub_date')
+    follows = connection.ops.quote_name(Follow._meta.db_table)
+    readers = ''
+    if user_ids is not None:
+        user_ids = tuple(user_ids)
+        if not user_ids:
+            return
+        readers = ' AND follow.user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids)))
+    for author_id in author_ids:
+        if not fans_out(author_id):
+            continue
+        latest, params = posts.filter(
+            author_id=author_id)[:TIMELINE_BACKFILL].query.sql_with_params()
+        _insert_entries(
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {follows} follow, ({latest}) post '
+            f'WHERE follow.author_id = %s{readers}',
+            params + (author_id,) + (user_ids or ()))
+
+
+def prune(follow):
+    """Убирает посты автора из ленты отписавшегося читателя."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+def follower_scopes(author_id):
+    """Области счётчиков лент подписчиков, в которые раскладывается автор.
+
+    Авторов выше порога в ленту подмешивают при чтении: её счётчик
+    зависит от области автора, см. follow_scopes.
+    """
+    if not fans_out(author_id):
+        return []
+    return [f'follow:{user_id}' for user_id in Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)]
+
+
+def merged_authors(user):
+    """Авторы, чьи посты подмешиваются в ленту подписок при чтении."""
+    return list(Follow.objects.filter(user=user).annotate(
+        pending=Exists(Post.objects.filter(
+            author_id=OuterRef('author_id'), timeline_pending=True))
+    ).filter(
+        Q(author__stats__followers_count__gt=TIMELINE_FANOUT_LIMIT)
+        | Q(pending=True)
+    ).values_list('author_id', flat=True))
+
+
+def follow_scopes(user, merged):
+    """Области счётчика ленты подписок: сама лента и подмешанные авторы."""
+    return [f'follow:{user.pk}'] + [f'author:{pk}' for pk in merged]
+
+
+def follow_feed(user, merged=None):
+    """Посты ленты подписок пользователя.
+
+    Обычно это выборка по индексу материализованной ленты; посты
+    авторов с большим числом подписчиков и посты, ещё ждущие
+    fan_out_posts, подмешиваются при чтении.
+    """
+    if merged is None:
+        merged = merged_authors(user)
+    if not merged:
+        # порядок и курсор по колонкам ленты: её индекс читается без
+        # сортировки, аннотации переиспользуют JOIN из filter()
+        return Post.objects.filter(timeline__user=user).annotate(
+            feed_date=F('timeline__pub_date'),
+            feed_id=F('timeline__post_id'),
+        ).order_by('-feed_date', '-feed_id')
+    return Post.objects.filter(
+        Q(id__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=merged))
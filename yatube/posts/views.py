@@ -1,68 +1,116 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponseBadRequest,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from .etags import (group_etag, index_etag, post_etag, profile_etag,
+                    validated)
+from .exporter import CONTENT_TYPES, Export, parse_watermark
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .settings import PAGINATOR_COUNT
+from .page_cache import anonymous_page_cache
+from .paginator import INDEX_SCOPE, paginate
+from .search import search_posts
+from .timeline import follow_feed, follow_scopes, merged_authors
 
 
-def page_view(request, post_list):
-    paginator = Paginator(post_list, PAGINATOR_COUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def page_view(request, post_list, scopes):
+    # страницу ленты обычно уже прочитал валидатор ETag
+    page = validated(request, 'page')
+    if page is not None:
+        return page
+    return paginate(request, post_list.select_related('author', 'group'),
+                    scopes=scopes)
 
 
+def is_following(request, author):
+    if not request.user.is_authenticated or author == request.user:
+        return False
+    # подписку уже проверил валидатор ETag
+    if hasattr(author, 'is_following'):
+        return author.is_following
+    return Follow.objects.filter(user=request.user, author=author).exists()
+
+
+@condition(etag_func=index_etag)
 @cache_page(20, key_prefix='index_page')
 def index(request):
-    page = page_view(request, Post.objects.all())
+    page = page_view(request, Post.objects.all(), [INDEX_SCOPE])
     return render(request, 'index.html', {'page': page})
 
 
+@anonymous_page_cache('group:{slug}')
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    page = page_view(request, group.posts.all())
+    group = validated(request, 'group') or get_object_or_404(
+        Group, slug=slug)
+    page = page_view(request, group.posts.all(), [f'group:{group.pk}'])
     context = {'group': group, 'page': page}
     return render(request, 'group.html', context)
 
 
+@anonymous_page_cache('author:{username}')
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = (
-        request.user.is_authenticated
-        and author != request.user
-        and Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
-    )
-    page = page_view(request, author.posts.all())
-    context = {'author': author, 'page': page, 'following': following}
+    author = validated(request, 'author') or get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    page = page_view(request, author.posts.all(), [f'author:{author.pk}'])
+    context = {'author': author, 'page': page,
+               'following': is_following(request, author)}
     return render(request, 'profile.html', context)
 
 
+@anonymous_page_cache('author:{username}')
+@condition(etag_func=post_etag)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
-    following = (
-        request.user.is_authenticated
-        and post.author != request.user
-        and Follow.objects.filter(
-            user=request.user,
-            author=post.author
-        ).exists()
-    )
-    comments = post.comments.all()
+    post = validated(request, 'post') or get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        id=post_id, author__username=username)
+    if hasattr(post, 'is_following'):
+        post.author.is_following = post.is_following
+    comments = post.comments.select_related('author')
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'form': form,
         'comments': comments,
         'author': post.author,
-        'following': following}
+        'following': is_following(request, post.author)}
     return render(request, 'post.html', context)
 
 
+def search(request):
+    """Посты по словам запроса, от лучших совпадений к худшим"""
+    query = request.GET.get('q', '').strip()
+    page = query and search_posts(query, after=request.GET.get('after'),
+                                  before=request.GET.get('before'))
+    return render(request, 'search.html', {'query': query, 'page': page})
+
+
+@staff_member_required
+def export(request, kind):
+    """Выгрузка для аналитики потоком; ?after= продолжает прерванную."""
+    data_format = request.GET.get('format', 'ndjson')
+    if data_format not in CONTENT_TYPES:
+        raise Http404
+    after = request.GET.get('after')
+    try:
+        after = parse_watermark(after) if after else None
+    except ValueError:
+        return HttpResponseBadRequest('Неверный водяной знак')
+    compress = bool(request.GET.get('gzip'))
+    filename = f'{kind}.{data_format}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        Export(kind, data_format, after, compress),
+        content_type=('application/gzip' if compress
+                      else CONTENT_TYPES[data_format]))
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None,
@@ -84,7 +132,8 @@ def post_edit(request, username, post_id):
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        form.save()
+        # только поля формы: версия и счётчики меняются в базе через F()
+        form.save(commit=False).save(update_fields=PostForm.Meta.fields)
         return redirect('post', username, post_id)
     return render(request, 'new_post.html', {'form': form, 'post': post})
 
@@ -118,8 +167,9 @@ def add_comment(request, username, post_id):
 @login_required
 def follow_index(request):
     """Посты авторов, на которых подписан текущий пользователь"""
-    page = page_view(
-        request, Post.objects.filter(author__following__user=request.user))
+    merged = merged_authors(request.user)
+    page = page_view(request, follow_feed(request.user, merged),
+                     follow_scopes(request.user, merged))
     context = {'page': page, 'user': request.user}
     return render(request, "follow.html", context)
 
@@ -0,0 +1,223 @@
+"""Кэш в файле SQLite, общий для всех процессов на одном хосте.
+
+Подключается в settings.CACHES::
+
+    'default': {
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 1024 * 1024},
+    }
+
+Записи вытесняются по давности последнего чтения (LRU), когда число
+записей или их суммарный размер превышают лимиты.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE stats SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE stats SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE stats SET size = size - old.size + new.size;
+END;
+'''
+# SQLite ограничивает число параметров в одном запросе
+CHUNK = 500
+# Время чтения для LRU обновляется не чаще раза в секунду
+ACCESS_RESOLUTION = 1
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # соединение своё у каждого потока и у каждого процесса после fork
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=30,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            # REPLACE должен запускать триггер удаления для учёта размера
+            db.execute('PRAGMA recursive_triggers=ON')
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _rows(self, keys):
+        """Живые записи по ключам с отметкой о чтении для LRU."""
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            found.update(self._db.execute(
+                f'SELECT key, value FROM cache WHERE key IN ({marks}) '
+                f'AND (expires IS NULL OR expires > ?)',
+                [*chunk, now]).fetchall())
+            self._db.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({marks}) '
+                f'AND accessed < ?',
+                [now, *chunk, now - ACCESS_RESOLUTION])
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def _write(self, rows, timeout, replace=True):
+        """Пишет записи в одной транзакции и вытесняет лишнее."""
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        written = 0
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for key, value in rows:
+                value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                if not replace:
+                    db.execute('DELETE FROM cache WHERE key = ? '
+                               'AND expires <= ?', [key, now])
+                written += db.execute(
+                    'INSERT OR {} INTO cache VALUES (?, ?, ?, ?, ?)'.format(
+                        'REPLACE' if replace else 'IGNORE'),
+                    [key, value, expires, now, len(value)]).rowcount
+            self._cull(now)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return written
+
+    def _cull(self, now):
+        db = self._db
+        entries, size = db.execute(
+            'SELECT entries, size FROM stats').fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        if not self._cull_frequency:
+            # как у DatabaseCache: CULL_FREQUENCY=0 очищает весь кэш;
+            # остаются только записи этого вызова, у них accessed = now
+            db.execute('DELETE FROM cache WHERE accessed < ?', [now])
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', [now])
+        entries, size = db.execute(
+            'SELECT entries, size FROM stats').fetchone()
+        while entries > self._max_entries or size > self._max_size:
+            victims = max(entries - self._max_entries,
+                          entries // self._cull_frequency, 1)
+            db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM '
+                       'cache ORDER BY accessed LIMIT ?)', [victims])
+            entries, size = db.execute(
+                'SELECT entries, size FROM stats').fetchone()
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        return {made[key]: value
+                for key, value in self._rows(list(made)).items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [key, time.time()]).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value)
+                     for key, value in data.items()], timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._write([(self._key(key, version), value)], timeout,
+                           replace=False) == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()]
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        # чтение и запись под одной блокировкой: инкремент атомарен
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [key, time.time()]).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute('UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                       [data, len(data), key])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        self._db.execute('DELETE FROM cache WHERE key = ?',
+                         [self._key(key, version)])
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            self._db.execute('DELETE FROM cache WHERE key IN ({})'.format(
+                ','.join('?' * len(chunk))), chunk)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # соединение переживает запрос: закрывать его на каждом ответе дорого
+        pass
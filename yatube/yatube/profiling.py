@@ -0,0 +1,120 @@
+"""Профиль одного запроса по требованию сотрудника.
+
+Сотрудник добавляет к любому адресу ?prof (или заголовок X-Profile) и
+вместо страницы получает текстовый отчёт: статистику cProfile,
+отсортированную по значению параметра (cumulative, tottime, calls...),
+и журнал SQL со временем каждого запроса и строкой кода, из которой он
+пришёл. ?prof=raw отдаёт сырой файл статистики для snakeviz и pstats.
+
+На обычных запросах middleware только проверяет параметр: cProfile
+импортируется и включается лишь для запроса с профилем.
+"""
+import io
+import os
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+PARAM = 'prof'
+HEADER = 'HTTP_X_PROFILE'
+DEFAULT_SORT = 'cumulative'
+SORTS = ('calls', 'cumulative', 'filename', 'line', 'name', 'ncalls',
+         'pcalls', 'stdname', 'time', 'tottime')
+RAW = 'raw'
+STATS_LINES = 60
+SQL_WIDTH = 300
+# кадры пакета проекта (middleware, настройки) местом запроса не считаются
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def origin():
+    """Последняя строка кода проекта в стеке: откуда пришёл запрос к базе."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if (frame.filename.startswith(settings.BASE_DIR)
+                and not frame.filename.startswith(PROJECT_DIR)):
+            return '{}:{} {}'.format(
+                os.path.relpath(frame.filename, settings.BASE_DIR),
+                frame.lineno, frame.name)
+    return '-'
+
+
+class QueryLog:
+    """Запросы к базе: время, SQL и место в коде."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql,
+                                 origin()))
+
+    def report(self):
+        total = sum(duration for duration, _, _ in self.queries)
+        lines = ['{} SQL queries, {:.1f} ms'.format(
+            len(self.queries), total * 1000)]
+        for number, (duration, sql, place) in enumerate(self.queries, 1):
+            lines.append('{:>4}. {:>8.2f} ms  {}'.format(
+                number, duration * 1000, place))
+            lines.append('      ' + sql[:SQL_WIDTH])
+        return '\n'.join(lines)
+
+
+class ProfilerMiddleware:
+    """Ставится после AuthenticationMiddleware: нужен request.user."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sort = request.GET.get(PARAM, request.META.get(HEADER))
+        user = getattr(request, 'user', None)
+        if sort is None or not (user and user.is_staff):
+            return self.get_response(request)
+        sort = sort or DEFAULT_SORT
+        if sort not in SORTS + (RAW,):
+            return HttpResponse(
+                'prof: один из {}'.format(', '.join(SORTS + (RAW,))),
+                status=400, content_type='text/plain; charset=utf-8')
+        return self.profile(request, sort)
+
+    def profile(self, request, sort):
+        import cProfile
+        import marshal
+        import pstats
+
+        queries = QueryLog()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+                # шаблонные ответы рендерятся позже, но их тоже меряем
+                if hasattr(response, 'render'):
+                    response.render()
+            finally:
+                profiler.disable()
+        if sort == RAW:
+            profiler.create_stats()
+            raw = HttpResponse(marshal.dumps(profiler.stats),
+                               content_type='application/octet-stream')
+            raw['Content-Disposition'] = (
+                'attachment; filename="request.prof"')
+            return raw
+        stream = io.StringIO()
+        stream.write('{} {} -> {}\n\n'.format(
+            request.method, request.get_full_path(), response.status_code))
+        pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(
+            STATS_LINES)
+        stream.write(queries.report())
+        return HttpResponse(stream.getvalue(),
+                            content_type='text/plain; charset=utf-8')
@@ -49,15 +49,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы total включал всю цепочку; без SERVER_TIMING выключен
+    'yatube.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # ?prof у сотрудника: профиль запроса вместо страницы
+    'yatube.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Заголовок Server-Timing и сводка по страницам (manage.py timing_report)
+SERVER_TIMING = bool(os.environ.get('SERVER_TIMING'))
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
@@ -135,6 +143,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Как posts.media отдаёт файлы: пусто — потоком из Django (os.sendfile
+# через wsgi.file_wrapper сервера), 'x-sendfile' — заголовком для Apache
+# и lighttpd, 'x-accel-redirect' — через internal location nginx
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 # Login
 
 LOGIN_URL = '/auth/login/'
@@ -154,3 +167,15 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Кэш, общий для всех воркеров на одном хосте
+if os.environ.get('SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'SHARED_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    }
@@ -0,0 +1,238 @@
+"""Разбивка времени запроса: заголовок Server-Timing и сводка по страницам.
+
+Включается переменной окружения SERVER_TIMING. Выключенный middleware
+поднимает MiddlewareNotUsed, Django убирает его из цепочки, а обёртки
+шаблонов и кэша не ставятся: запросы идут без накладных расходов.
+
+Замеряются запросы к базе (execute_wrapper), рендер шаблонов, чтения
+кэша с попаданиями и промахами и всё время ответа. Суммы по имени
+маршрута копятся в процессе и раз в FLUSH_INTERVAL секунд прибавляются
+к счётчикам в кэше, так что сводка общая для воркеров с общим кэшем
+(см. manage.py timing_report). Имена маршрутов хранятся по ключу на имя:
+cache.add пускает одного воркера, и тот берёт номер ячейки через incr —
+общего множества, которое воркеры перезаписывают друг за другом, нет.
+
+Потоковый ответ отдаёт тело уже после middleware: замеры остаются
+открытыми до его закрытия, а заголовок не ставится — к первому байту
+итогов ещё нет.
+"""
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+FLUSH_INTERVAL = 10
+KEY_PREFIX = 'server_timing'
+SLOTS_KEY = f'{KEY_PREFIX}:slots'
+# времена в секундах, в кэше — в микросекундах
+TIMES = ('total', 'db', 'template', 'cache')
+COUNTS = ('requests', 'queries', 'hits', 'misses')
+UNRESOLVED = '-'
+
+_current = threading.local()
+_missing = object()
+_installed = False
+
+
+class Timings:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.values = dict.fromkeys(TIMES + COUNTS, 0)
+        self.depth = dict.fromkeys(TIMES, 0)
+
+    def db(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.values['db'] += time.perf_counter() - start
+            self.values['queries'] += 1
+
+    def header(self):
+        values = self.values
+        return ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(
+                values['db'] * 1000, values['queries']),
+            'tpl;dur={:.1f}'.format(values['template'] * 1000),
+            'cache;dur={:.1f};desc="{} hits, {} misses"'.format(
+                values['cache'] * 1000, values['hits'], values['misses']),
+            'total;dur={:.1f}'.format(values['total'] * 1000),
+        ])
+
+
+def _timed(field, method, count=None):
+    """Обёртка, добавляющая время вызова к замерам текущего запроса.
+
+    Вложенные вызовы не считаются: get_many у LocMemCache — это цикл get,
+    а шаблон карточки рендерится внутри шаблона страницы.
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = getattr(_current, 'timings', None)
+        if timings is None or timings.depth[field]:
+            return method(*args, **kwargs)
+        timings.depth[field] += 1
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+            if count:
+                count(timings.values, args, result)
+            return result
+        finally:
+            timings.values[field] += time.perf_counter() - start
+            timings.depth[field] -= 1
+    return wrapper
+
+
+def _count_get(values, args, result):
+    values['misses' if result is _missing else 'hits'] += 1
+
+
+def _count_get_many(values, args, result):
+    values['hits'] += len(result)
+    values['misses'] += len(args[1]) - len(result)
+
+
+def _instrument_cache(backend):
+    get = _timed('cache', backend.get, _count_get)
+    get_many = _timed('cache', backend.get_many, _count_get_many)
+
+    def get_with_default(self, key, default=None, version=None):
+        # промах отличается от сохранённого None по метке
+        value = get(self, key, _missing, version=version)
+        return default if value is _missing else value
+
+    def get_many_list(self, keys, version=None):
+        return get_many(self, list(keys), version=version)
+
+    backend.get = get_with_default
+    backend.get_many = get_many_list
+
+
+def install():
+    """Ставит обёртки рендера шаблонов и чтений кэша; один раз."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = _timed('template', Template.render)
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        _instrument_cache(backend)
+
+
+def _key(name, field):
+    return f'{KEY_PREFIX}:{name}:{field}'
+
+
+def _name_key(name):
+    return f'{KEY_PREFIX}:name:{name}'
+
+
+def _slot_key(number):
+    return f'{KEY_PREFIX}:slot:{number}'
+
+
+def register(names):
+    """Заносит новые имена в список маршрутов; ячейку берёт один воркер."""
+    for name in names:
+        if cache.add(_name_key(name), True, None):
+            cache.add(SLOTS_KEY, 0, None)
+            cache.set(_slot_key(cache.incr(SLOTS_KEY)), name, None)
+
+
+def _slots():
+    return [_slot_key(number)
+            for number in range(1, (cache.get(SLOTS_KEY) or 0) + 1)]
+
+
+def _names():
+    return set(cache.get_many(_slots()).values())
+
+
+def report():
+    """Суммы по маршрутам из кэша: {имя: {поле: значение}}."""
+    names = _names()
+    stored = cache.get_many([_key(name, field) for name in names
+                             for field in TIMES + COUNTS])
+    return {name: {field: (stored.get(_key(name, field), 0) / 1e6
+                           if field in TIMES
+                           else stored.get(_key(name, field), 0))
+                   for field in TIMES + COUNTS}
+            for name in names}
+
+
+def reset():
+    slots = _slots()
+    names = set(cache.get_many(slots).values())
+    cache.delete_many([_key(name, field) for name in names
+                       for field in TIMES + COUNTS]
+                      + [_name_key(name) for name in names]
+                      + slots + [SLOTS_KEY])
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed = time.monotonic()
+
+    def __call__(self, request):
+        timings = _current.timings = Timings()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            stack.callback(setattr, _current, 'timings', None)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.db))
+            response = self.get_response(request)
+            if response.streaming:
+                # тело читается после возврата: замер закончится
+                # в response.close()
+                closing = stack.pop_all()
+                closing.callback(self.finish, request, timings, start)
+                response._closable_objects.append(closing)
+                return response
+        self.finish(request, timings, start)
+        response['Server-Timing'] = timings.header()
+        return response
+
+    def finish(self, request, timings, start):
+        timings.values['total'] = time.perf_counter() - start
+        timings.values['requests'] = 1
+        match = request.resolver_match
+        self.record(match.view_name if match else UNRESOLVED,
+                    timings.values)
+
+    def record(self, name, values):
+        with self.lock:
+            totals = self.pending.setdefault(
+                name, dict.fromkeys(TIMES + COUNTS, 0))
+            for field, value in values.items():
+                totals[field] += value
+            if time.monotonic() - self.flushed < FLUSH_INTERVAL:
+                return
+            pending, self.pending = self.pending, {}
+            self.flushed = time.monotonic()
+        self.flush(pending)
+
+    def flush(self, pending):
+        """Прибавляет накопленное процессом к общим счётчикам в кэше."""
+        register(pending)
+        for name, totals in pending.items():
+            for field, value in totals.items():
+                value = int(value * 1e6) if field in TIMES else value
+                if not value:
+                    continue
+                key = _key(name, field)
+                cache.add(key, 0, None)
+                cache.incr(key, value)